@@ -25,38 +25,51 @@ from random import randint
 from apscheduler.schedulers.background import BackgroundScheduler
 from pyrogram import Client
 
-from plugins import glovar
-from plugins.functions.timers import backup_files, clean_banned, clean_members, interval_hour_01, interval_min_10
-from plugins.functions.timers import reset_data, send_count, update_admins, update_status
-
 # Enable logging
 logger = logging.getLogger(__name__)
 
-# Config session
-app = Client(
-    session_name="bot",
-    bot_token=glovar.bot_token
-)
-app.start()
-
-# Send online status
-update_status(app, "online")
-
-# Timer
-scheduler = BackgroundScheduler(job_defaults={"misfire_grace_time": 60})
-scheduler.add_job(interval_hour_01, "interval", [app], hours=1)
-scheduler.add_job(interval_min_10, "interval", minutes=10)
-scheduler.add_job(update_status, "cron", [app, "awake"], minute=randint(30, 34), second=randint(0, 59))
-scheduler.add_job(clean_members, "cron", [app], hour=2)
-scheduler.add_job(clean_banned, "cron", [app], hour=3)
-scheduler.add_job(backup_files, "cron", [app], hour=20)
-scheduler.add_job(send_count, "cron", [app], hour=21)
-scheduler.add_job(reset_data, "cron", [app], day=glovar.date_reset, hour=22)
-scheduler.add_job(update_admins, "cron", [app], hour=22, minute=30)
-scheduler.start()
-
-# Hold
-app.idle()
-
-# Stop
-app.stop()
+# The QR code decoding processes run this file as __mp_main__, only start the bot in the main process
+if __name__ == "__main__":
+    from plugins import glovar
+    from plugins.functions.group import update_group
+    from plugins.functions.image import start_qrcode_pool
+    from plugins.functions.timers import backup_files, clean_banned, clean_members, interval_hour_01, interval_min_01
+    from plugins.functions.timers import interval_min_10
+    from plugins.functions.timers import reset_data, send_count, update_admins, update_status
+
+    # Start the QR code decoding processes
+    start_qrcode_pool()
+
+    # Config session
+    app = Client(
+        session_name="bot",
+        bot_token=glovar.bot_token
+    )
+    app.start()
+
+    # Warm the group cache
+    for gid in list(glovar.admin_ids):
+        update_group(app, gid)
+
+    # Send online status
+    update_status(app, "online")
+
+    # Timer
+    scheduler = BackgroundScheduler(job_defaults={"misfire_grace_time": 60})
+    scheduler.add_job(interval_hour_01, "interval", [app], hours=1)
+    scheduler.add_job(interval_min_01, "interval", [app], minutes=1)
+    scheduler.add_job(interval_min_10, "interval", minutes=10)
+    scheduler.add_job(update_status, "cron", [app, "awake"], minute=randint(30, 34), second=randint(0, 59))
+    scheduler.add_job(clean_members, "cron", [app], hour=2)
+    scheduler.add_job(clean_banned, "cron", [app], hour=3)
+    scheduler.add_job(backup_files, "cron", [app], hour=20)
+    scheduler.add_job(send_count, "cron", [app], hour=21)
+    scheduler.add_job(reset_data, "cron", [app], day=glovar.date_reset, hour=22)
+    scheduler.add_job(update_admins, "cron", [app], hour=22, minute=30)
+    scheduler.start()
+
+    # Hold
+    app.idle()
+
+    # Stop
+    app.stop()
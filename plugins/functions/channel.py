@@ -17,6 +17,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
+from hashlib import blake2b
 from json import dumps
 from typing import List, Optional, Union
 
@@ -26,7 +27,8 @@ from pyrogram.errors import FloodWait
 from .. import glovar
 from .etc import code, code_block, general_link, get_forward_name, get_full_name, get_md5sum, get_text, lang
 from .etc import message_link, thread, wait_flood
-from .file import crypt_file, data_to_file, delete_file, get_new_path, save
+from .file import data_to_file, delete_file, get_encrypted_path, save
+from .ids import add_declared_id, set_user_score
 from .image import get_file_id
 from .telegram import get_group_info, send_document, send_message
 
@@ -67,7 +69,7 @@ def ask_for_help(client: Client, level: str, gid: int, uid: int, group: str = "s
 def declare_message(client: Client, gid: int, mid: int) -> bool:
     # Declare a message
     try:
-        glovar.declared_message_ids[gid].add(mid)
+        add_declared_id(gid, mid)
         share_data(
             client=client,
             receivers=glovar.receivers["declare"],
@@ -221,30 +223,35 @@ def forward_evidence(client: Client, message: Message, level: str, rule: str, th
     return result
 
 
-def get_content(message: Message) -> str:
-    # Get the message that will be added to lists, return the file_id and text's hash
-    result = ""
+def get_content(message: Message) -> bytes:
+    # Get the message that will be added to lists, return the digest of the file_id and text's hash
+    result = b""
     try:
         if not message:
-            return ""
+            return b""
+
+        content = ""
 
         file_id, _, _ = get_file_id(message)
         text = get_text(message)
 
         if file_id:
-            result += file_id
+            content += file_id
 
         if message.audio:
-            result += message.audio.file_id
+            content += message.audio.file_id
 
         if message.document:
-            result += message.document.file_id
+            content += message.document.file_id
 
         if message.sticker and message.sticker.is_animated:
-            result += message.sticker.file_id
+            content += message.sticker.file_id
 
         if text:
-            result += get_md5sum("string", text)
+            content += get_md5sum("string", text)
+
+        if content:
+            result = blake2b(content.encode(), digest_size=16).digest()
     except Exception as e:
         logger.warning(f"Get content error: {e}", exc_info=True)
 
@@ -393,24 +400,28 @@ def share_data_thread(client: Client, receivers: List[str], action: str, action_
         )
 
         if encrypt:
-            # Encrypt the file, save to the tmp directory
-            file_path = get_new_path()
-            crypt_file("encrypt", file, file_path)
+            # Encrypt the file, compress it only if every receiver can read it, save to the tmp directory
+            zipped = all(receiver in glovar.zip_receivers for receiver in receivers)
+            file_path = get_encrypted_path(file, zipped)
         else:
             # Send directly
             file_path = file
 
-        result = send_document(client, channel_id, file_path, None, text)
+        if file_path:
+            result = send_document(client, channel_id, file_path, None, text)
+        else:
+            result = False
 
-        if not result:
-            return ((result is False and not glovar.should_hide)
-                    and share_data_failed(client, receivers, action, action_type, data, file, encrypt))
+        # Delete the encrypted tmp file
+        file_path and file_path != file and thread(delete_file, (file_path,))
 
-        # Delete the tmp file
-        for f in {file, file_path}:
-            f.startswith("tmp/") and thread(delete_file, (f,))
+        # Retry with the original file, or delete it
+        if result is False and not glovar.should_hide:
+            return share_data_failed(client, receivers, action, action_type, data, file, encrypt)
 
-        return True
+        file.startswith("tmp/") and thread(delete_file, (file,))
+
+        return bool(result)
     except Exception as e:
         logger.warning(f"Share data thread error: {e}", exc_info=True)
 
@@ -468,9 +479,9 @@ def share_watch_user(client: Client, the_type: str, uid: int, until: str) -> boo
 def update_score(client: Client, uid: int) -> bool:
     # Update a user's score, share it
     try:
-        count = len(glovar.user_ids[uid]["detected"])
+        count = len(glovar.user_ids["detected"].get(uid, {}))
         score = count * 0.6
-        glovar.user_ids[uid]["score"][glovar.sender.lower()] = score
+        set_user_score(uid, glovar.sender.lower(), score)
         save("user_ids")
         share_data(
             client=client,
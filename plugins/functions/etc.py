@@ -342,15 +342,21 @@ def get_links(message: Message) -> List[str]:
     return result
 
 
-def get_md5sum(the_type: str, ctx: str) -> str:
-    # Get the md5sum of a string or file
+def get_md5sum(the_type: str, ctx: Union[bytes, str]) -> str:
+    # Get the md5sum of a string, bytes or file
     result = ""
 
     try:
-        if not ctx.strip():
+        if not ctx:
             return ""
 
-        if the_type == "file":
+        # Do not copy the bytes
+        if the_type != "bytes" and not ctx.strip():
+            return ""
+
+        if the_type == "bytes":
+            result = md5(ctx).hexdigest()
+        elif the_type == "file":
             hash_md5 = md5()
 
             with open(ctx, "rb") as f:
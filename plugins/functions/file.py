@@ -17,13 +17,15 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
+from io import BytesIO
 from os import remove
-from os.path import exists
-from pickle import dump
+from os.path import exists, getsize
+from pickle import dump, load, loads
 from shutil import copyfile
 from typing import Any
+from zlib import compress, decompress
 
-from pyAesCrypt import decryptFile, encryptFile
+from pyAesCrypt import decryptFile, decryptStream, encryptFile, encryptStream
 from pyrogram import Client
 
 from .. import glovar
@@ -34,6 +36,72 @@ from .telegram import download_media
 logger = logging.getLogger(__name__)
 
 
+def bytes_to_data(data: bytes) -> Any:
+    # Load data from bytes
+    result = None
+    try:
+        if not data:
+            return None
+
+        if data[:len(glovar.zip_header)] == glovar.zip_header:
+            data = decompress(data[len(glovar.zip_header):])
+
+        result = loads(data)
+    except Exception as e:
+        logger.warning(f"Bytes to data error: {e}", exc_info=True)
+
+    return result
+
+
+def compress_bytes(data: bytes) -> bytes:
+    # Compress bytes, add the format header
+    result = data
+    try:
+        size = len(data)
+
+        if size < 1024:
+            return data
+
+        if size < 1024 * 1024:
+            level = 9
+        elif size < glovar.memory_size:
+            level = 6
+        else:
+            level = 1
+
+        compressed = glovar.zip_header + compress(data, level)
+
+        if len(compressed) < size:
+            result = compressed
+    except Exception as e:
+        logger.warning(f"Compress bytes error: {e}", exc_info=True)
+
+    return result
+
+
+def crypt_bytes(operation: str, data: bytes) -> bytes:
+    # Encrypt or decrypt bytes in memory
+    result = b""
+    try:
+        if not data:
+            return b""
+
+        buffer = 64 * 1024
+        stream_in = BytesIO(data)
+        stream_out = BytesIO()
+
+        if operation == "decrypt":
+            decryptStream(stream_in, stream_out, glovar.password, buffer, len(data))
+        else:
+            encryptStream(stream_in, stream_out, glovar.password, buffer)
+
+        result = stream_out.getvalue()
+    except Exception as e:
+        logger.warning(f"Crypt bytes error: {e}", exc_info=True)
+
+    return result
+
+
 def crypt_file(operation: str, file_in: str, file_out: str) -> bool:
     # Encrypt or decrypt a file
     try:
@@ -82,6 +150,44 @@ def delete_file(path: str) -> bool:
     return False
 
 
+def file_to_data(path: str) -> Any:
+    # Load data from a file
+    result = None
+    try:
+        if not path or not exists(path):
+            return None
+
+        with open(path, "rb") as f:
+            if f.read(len(glovar.zip_header)) == glovar.zip_header:
+                result = loads(decompress(f.read()))
+            else:
+                f.seek(0)
+                result = load(f)
+    except Exception as e:
+        logger.warning(f"File to data error: {e}", exc_info=True)
+
+    return result
+
+
+def get_downloaded_data(client: Client, file_id: str, file_ref: str) -> bytes:
+    # Download file, get it's content in memory
+    result = b""
+    try:
+        path = get_downloaded_path(client, file_id, file_ref)
+
+        if not path:
+            return b""
+
+        with open(path, "rb") as f:
+            result = f.read()
+
+        delete_file(path)
+    except Exception as e:
+        logger.warning(f"Get downloaded data error: {e}", exc_info=True)
+
+    return result
+
+
 def get_downloaded_path(client: Client, file_id: str, file_ref: str) -> str:
     # Download file, get it's path on local machine
     final_path = ""
@@ -97,6 +203,35 @@ def get_downloaded_path(client: Client, file_id: str, file_ref: str) -> str:
     return final_path
 
 
+def get_encrypted_path(file: str, zipped: bool = False) -> str:
+    # Encrypt a data file, compress it if the receivers can read it, save to the tmp directory
+    result = ""
+    try:
+        file_path = get_new_path()
+
+        # Large file or plain receivers, encrypt it without compression
+        if not zipped or getsize(file) > glovar.memory_size:
+            crypt_file("encrypt", file, file_path)
+            return file_path
+
+        with open(file, "rb") as f:
+            data = f.read()
+
+        data = crypt_bytes("encrypt", compress_bytes(data))
+
+        if not data:
+            return ""
+
+        with open(file_path, "wb") as f:
+            f.write(data)
+
+        result = file_path
+    except Exception as e:
+        logger.warning(f"Get encrypted path error: {e}", exc_info=True)
+
+    return result
+
+
 def get_new_path(extension: str = "", prefix: str = "") -> str:
     # Get a new path in tmp directory
     result = ""
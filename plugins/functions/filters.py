@@ -19,17 +19,19 @@
 import logging
 import re
 from copy import deepcopy
+from hashlib import blake2b
 from string import ascii_lowercase
-from typing import Match, Optional, Union
+from typing import Match, Optional, Tuple, Union
 
 from pyrogram import CallbackQuery, Client, Filters, Message, User
 
 from .. import glovar
 from .channel import get_content
 from .etc import get_channel_link, get_command_type, get_entity_text, get_now, get_links, get_md5sum
-from .etc import get_stripped_link, get_text, thread
-from .file import delete_file, get_downloaded_path, save
-from .group import get_description, get_group_sticker, get_member, get_pinned
+from .etc import get_stripped_link, get_text, t2t
+from .file import get_downloaded_data, save
+from .group import get_bypass, get_member
+from .ids import add_sticker_id, get_detected_content, get_user_score, get_watch_until, has_except_temp, has_id
 from .ids import init_group_id
 from .image import get_file_id, get_qrcode
 from .telegram import resolve_username
@@ -100,7 +102,7 @@ def is_class_d(_, message: Message) -> bool:
         if message.forward_from:
             fid = message.forward_from.id
 
-            if fid in glovar.bad_ids["users"]:
+            if has_id(glovar.bad_ids["users"], fid):
                 return True
 
         if message.forward_from_chat:
@@ -134,8 +136,7 @@ def is_class_e(_, message: Message) -> bool:
         if not content:
             return False
 
-        if (content in glovar.except_ids["long"]
-                or content in glovar.except_ids["temp"]):
+        if content in glovar.except_ids["long"] or has_except_temp(content):
             return True
     except Exception as e:
         logger.warning(f"Is class e error: {e}", exc_info=True)
@@ -350,6 +351,34 @@ def is_ban_text(text: str, ocr: bool, message: Message = None) -> bool:
     return False
 
 
+def is_bad_bio(bio: str) -> bool:
+    # Check if the bio is bio text, cache the verdict under the current rules
+    result = False
+    try:
+        if not bio:
+            return False
+
+        key = blake2b(bio.encode(), digest_size=16).digest()
+        generation = glovar.regex_generation
+        the_cache = glovar.bio_verdicts.get(key)
+
+        if the_cache and the_cache[0] == generation:
+            return the_cache[1]
+
+        result = is_bio_text(bio)
+
+        with glovar.locks["bio"]:
+            glovar.bio_verdicts.pop(key, None)
+            glovar.bio_verdicts[key] = (generation, result)
+
+            while len(glovar.bio_verdicts) > glovar.bios_size:
+                glovar.bio_verdicts.popitem(last=False)
+    except Exception as e:
+        logger.warning(f"Is bad bio error: {e}", exc_info=True)
+
+    return result
+
+
 def is_bio_text(text: str) -> bool:
     # Check if the text is bio text
     try:
@@ -376,6 +405,43 @@ def is_bmd(message: Message) -> bool:
     return False
 
 
+def is_bypass_message(client: Client, message: Message) -> bool:
+    # Check if the message matches the group's description, pinned message or sticker set
+    try:
+        # Basic data
+        gid = message.chat.id
+        message_content = get_content(message)
+        message_text = get_text(message)
+        bypass = get_bypass(client, gid)
+
+        description = bypass["description"]
+
+        if (description and message_text) and message_text in description:
+            return True
+
+        pinned_content = bypass["pinned_content"]
+
+        if (pinned_content and message_content) and message_content == pinned_content:
+            return True
+
+        pinned_text = bypass["pinned_text"]
+
+        if (pinned_text and message_text) and message_text in pinned_text:
+            return True
+
+        group_sticker = bypass["sticker"]
+
+        if message.sticker:
+            sticker_name = message.sticker.set_name
+
+            if sticker_name and sticker_name == group_sticker:
+                return True
+    except Exception as e:
+        logger.warning(f"Is bypass message error: {e}", exc_info=True)
+
+    return False
+
+
 def is_class_d_user(user: Union[int, User]) -> bool:
     # Check if the user is a Class D personnel
     try:
@@ -384,7 +450,7 @@ def is_class_d_user(user: Union[int, User]) -> bool:
         else:
             uid = user.id
 
-        if uid in glovar.bad_ids["users"]:
+        if has_id(glovar.bad_ids["users"], uid):
             return True
     except Exception as e:
         logger.warning(f"Is class d user error: {e}", exc_info=True)
@@ -400,14 +466,8 @@ def is_class_e_user(user: Union[int, User]) -> bool:
         else:
             uid = user.id
 
-        if uid in glovar.bot_ids:
+        if glovar.trusted_ids.get(uid, 0) > 0:
             return True
-
-        group_list = list(glovar.trust_ids)
-
-        for gid in group_list:
-            if uid in glovar.trust_ids.get(gid, set()):
-                return True
     except Exception as e:
         logger.warning(f"Is class e user error: {e}", exc_info=True)
 
@@ -430,7 +490,9 @@ def is_con_text(text: str, ocr: bool) -> bool:
 def is_declared_message_id(gid: int, mid: int) -> bool:
     # Check if the message's ID is declared by other bots
     try:
-        if mid in glovar.declared_message_ids.get(gid, set()):
+        top, mask = glovar.declared_message_ids.get(gid, (0, 0))
+
+        if 0 <= top - mid < glovar.declared_size and mask >> (top - mid) & 1:
             return True
     except Exception as e:
         logger.warning(f"Is declared message id error: {e}", exc_info=True)
@@ -448,7 +510,7 @@ def is_detected_url(message: Message, test: bool = False) -> str:
         links = get_links(message)
 
         for link in links:
-            detected_type = glovar.contents.get(link, "")
+            detected_type = get_detected_content(link)
 
             if detected_type and is_in_config(gid, detected_type):
                 return detected_type
@@ -478,12 +540,7 @@ def is_detected_user(message: Message) -> bool:
 def is_detected_user_id(gid: int, uid: int, now: int) -> bool:
     # Check if the user_id is detected in the group
     try:
-        user_status = glovar.user_ids.get(uid, {})
-
-        if not user_status:
-            return False
-
-        status = user_status["detected"].get(gid, 0)
+        status = glovar.user_ids["detected"].get(uid, {}).get(gid, 0)
 
         if now - status < glovar.time_punish:
             return True
@@ -597,9 +654,9 @@ def is_friend_username(client: Client, gid: int, username: str, friend: bool, fr
                 if is_class_e_user(peer_id):
                     return True
 
-            member = get_member(client, gid, peer_id)
+            status = get_member(client, gid, peer_id)
 
-            if member and member.status in {"creator", "administrator", "member"}:
+            if status in {"creator", "administrator", "member"}:
                 return True
     except Exception as e:
         logger.warning(f"Is friend username: {e}", exc_info=True)
@@ -614,12 +671,7 @@ def is_high_score_user(user: User) -> float:
             return 0.0
 
         uid = user.id
-        user_status = glovar.user_ids.get(uid, {})
-
-        if not user_status:
-            return 0.0
-
-        score = sum(user_status["score"].values())
+        score = get_user_score(uid)
 
         if score >= 3.0:
             return score
@@ -651,23 +703,20 @@ def is_limited_user(gid: int, user: User, now: int, short: bool = True) -> bool:
                 return True
 
         uid = user.id
+        join_status = glovar.user_ids["join"].get(uid, {})
 
-        if not glovar.user_ids.get(uid, {}):
-            return False
-
-        if not glovar.user_ids[uid].get("join", {}):
+        if not join_status:
             return False
 
         if is_high_score_user(user) >= 1.8:
             return True
 
-        join = glovar.user_ids[uid]["join"].get(gid, 0)
+        join = join_status.get(gid, 0)
 
         if short and now - join < glovar.time_short:
             return True
 
-        track = [gid for gid in glovar.user_ids[uid]["join"]
-                 if now - glovar.user_ids[uid]["join"][gid] < glovar.time_track]
+        track = [gid for gid in list(join_status) if now - join_status.get(gid, 0) < glovar.time_track]
 
         if len(track) >= glovar.limit_track:
             return True
@@ -684,24 +733,22 @@ def is_new_user(user: User, now: int, gid: int = 0, joined: bool = False) -> boo
             return False
 
         uid = user.id
+        join_status = glovar.user_ids["join"].get(uid, {})
 
-        if not glovar.user_ids.get(uid, {}):
-            return False
-
-        if not glovar.user_ids[uid].get("join", {}):
+        if not join_status:
             return False
 
         if joined:
             return True
 
         if gid:
-            join = glovar.user_ids[uid]["join"].get(gid, 0)
+            join = join_status.get(gid, 0)
 
             if now - join < glovar.time_new:
                 return True
         else:
-            for gid in list(glovar.user_ids[uid]["join"]):
-                join = glovar.user_ids[uid]["join"].get(gid, 0)
+            for gid in list(join_status):
+                join = join_status.get(gid, 0)
 
                 if now - join < glovar.time_new:
                     return True
@@ -711,6 +758,34 @@ def is_new_user(user: User, now: int, gid: int = 0, joined: bool = False) -> boo
     return False
 
 
+def is_nm_name(key: Tuple[str, int], name: str, normal: bool = True) -> bool:
+    # Check if the name is nm text, cache the verdict of the key's current name under the current rules
+    result = False
+    try:
+        if not name:
+            return False
+
+        digest = blake2b(name.encode(), digest_size=16).digest()
+        generation = glovar.regex_generation
+        the_cache = glovar.name_verdicts.get(key)
+
+        if the_cache and the_cache[0] == digest and the_cache[1] == generation:
+            return the_cache[2]
+
+        result = is_nm_text(t2t(name, True, True) if normal else name)
+
+        with glovar.locks["name"]:
+            glovar.name_verdicts.pop(key, None)
+            glovar.name_verdicts[key] = (digest, generation, result)
+
+            while len(glovar.name_verdicts) > glovar.names_size:
+                glovar.name_verdicts.popitem(last=False)
+    except Exception as e:
+        logger.warning(f"Is nm name error: {e}", exc_info=True)
+
+    return result
+
+
 def is_nm_text(text: str) -> bool:
     # Check if the text is nm text
     try:
@@ -724,13 +799,9 @@ def is_nm_text(text: str) -> bool:
     return False
 
 
-def is_not_allowed(client: Client, message: Message, text: str = None, image_path: str = None) -> str:
-    # Check if the message is not allowed in the group
-    if image_path:
-        need_delete = [image_path]
-    else:
-        need_delete = []
-
+def is_not_allowed(client: Client, message: Message, text: str = None, image_data: bytes = None,
+                   media: bool = True) -> str:
+    # Check if the message is not allowed in the group, return "media" if the media stage is still needed
     try:
         if not message.chat:
             return ""
@@ -738,35 +809,16 @@ def is_not_allowed(client: Client, message: Message, text: str = None, image_pat
         # Basic data
         gid = message.chat.id
         now = message.date or get_now()
+        need_media = False
 
         # Regular message
-        if not (text or image_path):
+        if not (text or image_data):
             # Bypass
-            message_content = get_content(message)
-            message_text = get_text(message)
-            description = get_description(client, gid)
-
-            if (description and message_text) and message_text in description:
-                return ""
-
-            pinned_message = get_pinned(client, gid)
-            pinned_content = get_content(pinned_message)
-
-            if (pinned_content and message_content) and message_content in pinned_content:
-                return ""
-
-            pinned_text = get_text(pinned_message)
-
-            if (pinned_text and message_text) and message_text in pinned_text:
+            if is_bypass_message(client, message):
                 return ""
 
-            group_sticker = get_group_sticker(client, gid)
-
-            if message.sticker:
-                sticker_name = message.sticker.set_name
-
-                if sticker_name and sticker_name == group_sticker:
-                    return ""
+            message_content = get_content(message)
+            message_text = get_text(message)
 
             # Check detected records
             if not is_class_c(None, message):
@@ -776,7 +828,7 @@ def is_not_allowed(client: Client, message: Message, text: str = None, image_pat
 
                 # Content
                 if message_content:
-                    detection = glovar.contents.get(message_content, "")
+                    detection = get_detected_content(message_content)
 
                     if detection and is_in_config(gid, detection):
                         return detection
@@ -929,24 +981,10 @@ def is_not_allowed(client: Client, message: Message, text: str = None, image_pat
 
                 # QR code
                 if is_in_config(gid, "qrc"):
-                    # Get the image
-                    file_id, file_ref, big = get_file_id(message)
-                    image_path = big and get_downloaded_path(client, file_id, file_ref)
-                    image_path and need_delete.append(image_path)
-
-                    # Check hash
-                    image_hash = image_path and get_md5sum("file", image_path)
-
-                    if image_path and image_hash and image_hash not in glovar.except_ids["temp"]:
-                        # Check declare status
-                        if is_declared_message(None, message):
-                            return ""
-
-                        # Get QR code
-                        qrcode = get_qrcode(image_path)
-
-                        if qrcode and not (glovar.nospam_id in glovar.admin_ids[gid] and is_ban_text(qrcode, False)):
-                            return "qrc"
+                    if not media:
+                        _, _, need_media = get_file_id(message)
+                    elif is_qrc(client, message):
+                        return "qrc"
 
             # Schedule to delete stickers and animations
             if (message.sticker
@@ -956,9 +994,11 @@ def is_not_allowed(client: Client, message: Message, text: str = None, image_pat
                         and "gif" in message.document.mime_type)
                     or message.dice):
                 mid = message.message_id
-                glovar.message_ids[gid]["stickers"][mid] = now
-                save("message_ids")
-                return ""
+                add_sticker_id(gid, mid, now)
+
+            # Leave the QR code to the media stage
+            if need_media:
+                return "media"
 
         # Preview message
         else:
@@ -998,20 +1038,48 @@ def is_not_allowed(client: Client, message: Message, text: str = None, image_pat
                         return "tgp"
 
             # QR code
-            if image_path:
-                qrcode = get_qrcode(image_path)
+            if image_data:
+                qrcode = get_qrcode(image_data)
 
                 if qrcode and not (glovar.nospam_id in glovar.admin_ids[gid] and is_ban_text(qrcode, False)):
                     return "qrc"
     except Exception as e:
         logger.warning(f"Is not allowed error: {e}", exc_info=True)
-    finally:
-        for file in need_delete:
-            thread(delete_file, (file,))
 
     return ""
 
 
+def is_qrc(client: Client, message: Message) -> bool:
+    # Check if the message's image contains a QR code
+    try:
+        # Basic data
+        gid = message.chat.id
+
+        # Get the image
+        file_id, file_ref, big = get_file_id(message)
+        image_data = big and get_downloaded_data(client, file_id, file_ref)
+
+        # Check hash
+        image_hash = image_data and get_md5sum("bytes", image_data)
+
+        if not image_data or not image_hash or has_except_temp(image_hash):
+            return False
+
+        # Check declare status
+        if is_declared_message(None, message):
+            return False
+
+        # Get QR code
+        qrcode = get_qrcode(image_data)
+
+        if qrcode and not (glovar.nospam_id in glovar.admin_ids[gid] and is_ban_text(qrcode, False)):
+            return True
+    except Exception as e:
+        logger.warning(f"Is qrc error: {e}", exc_info=True)
+
+    return False
+
+
 def is_regex_text(word_type: str, text: str, ocr: bool = False, again: bool = False) -> Optional[Match]:
     # Check if the text hit the regex rules
     result = None
@@ -1056,9 +1124,7 @@ def is_tgl(client: Client, message: Message, friend: bool = False) -> bool:
     try:
         # Bypass prepare
         gid = message.chat.id
-        description = get_description(client, gid).lower()
-        pinned_message = get_pinned(client, gid)
-        pinned_text = get_text(pinned_message).lower()
+        group_bypass = get_bypass(client, gid)
 
         # Check links
         bypass = get_stripped_link(get_channel_link(message))
@@ -1083,10 +1149,8 @@ def is_tgl(client: Client, message: Message, friend: bool = False) -> bool:
                             return True
 
                 if (f"{bypass}/" in f"{link}/"
-                        or link in description
-                        or (link_username and link_username in description)
-                        or link in pinned_text
-                        or (link_username and link_username in pinned_text)):
+                        or link in group_bypass["links"]
+                        or (link_username and link_username in group_bypass["usernames"])):
                     return True
             except Exception as ee:
                 logger.warning(f"Is bypass link error: {ee}", exc_info=True)
@@ -1123,10 +1187,7 @@ def is_tgl(client: Client, message: Message, friend: bool = False) -> bool:
                 if message.chat.username and username == message.chat.username.lower():
                     continue
 
-                if username in description:
-                    continue
-
-                if username in pinned_text:
+                if username in group_bypass["usernames"]:
                     continue
 
                 if not is_friend_username(client, gid, username, friend):
@@ -1134,12 +1195,9 @@ def is_tgl(client: Client, message: Message, friend: bool = False) -> bool:
 
             if en.type == "user":
                 uid = en.user.id
-                member = get_member(client, gid, uid)
-
-                if member is False:
-                    return True
+                status = get_member(client, gid, uid)
 
-                if member and member.status not in {"creator", "administrator", "member"}:
+                if status and status not in {"creator", "administrator", "member"}:
                     return True
     except Exception as e:
         logger.warning(f"Is tgl error: {e}", exc_info=True)
@@ -1154,7 +1212,7 @@ def is_watch_user(user: User, the_type: str, now: int) -> bool:
             return False
 
         uid = user.id
-        until = glovar.watch_ids[the_type].get(uid, 0)
+        until = get_watch_until(the_type, uid)
 
         if now < until:
             return True
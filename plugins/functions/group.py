@@ -17,14 +17,16 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
-from typing import Optional
+import re
+from typing import Dict, Optional, Set, Union
 
-from pyrogram import Chat, ChatMember, Client, Message
+from pyrogram import Chat, Client
 
 from .. import glovar
-from .etc import code, lang, t2t, thread
+from .channel import get_content
+from .etc import code, get_now, get_stripped_link, get_text, lang, t2t, thread
 from .file import save
-from .ids import init_group_id
+from .ids import init_group_id, pop_trust_ids
 from .telegram import delete_messages, get_chat, get_chat_member, leave_chat
 
 # Enable logging
@@ -47,6 +49,57 @@ def delete_message(client: Client, gid: int, mid: int) -> bool:
     return False
 
 
+def get_bypass(client: Client, gid: int) -> Dict[str, Union[bytes, str, Set[str]]]:
+    # Get the group's bypass index, build it once after each group info update
+    result = get_bypass_index(None)
+    try:
+        chat = get_group(client, gid)
+
+        if not chat:
+            return result
+
+        the_cache = glovar.chats.get(gid, {})
+
+        if the_cache.get("chat") is chat and the_cache.get("bypass"):
+            return the_cache["bypass"]
+
+        result = get_bypass_index(chat)
+
+        if the_cache.get("chat") is chat:
+            the_cache["bypass"] = result
+    except Exception as e:
+        logger.warning(f"Get bypass error: {e}", exc_info=True)
+
+    return result
+
+
+def get_bypass_index(chat: Optional[Chat]) -> Dict[str, Union[bytes, str, Set[str]]]:
+    # Get the normalized description, pinned message, links and usernames of a group
+    result = {
+        "description": "",
+        "links": set(),
+        "pinned_content": b"",
+        "pinned_text": "",
+        "sticker": "",
+        "usernames": set()
+    }
+    try:
+        if not chat:
+            return result
+
+        result["description"] = t2t(chat.description, False, False) if chat.description else ""
+        result["pinned_content"] = get_content(chat.pinned_message)
+        result["pinned_text"] = get_text(chat.pinned_message)
+        result["sticker"] = chat.sticker_set_name or ""
+        text = f"{result['description']}\n{result['pinned_text']}".lower()
+        result["links"] = {get_stripped_link(link) for link in re.findall(r"(?:https?://)?t\.me/[0-9a-z_/+\-]+", text)}
+        result["usernames"] = set(re.findall(r"(?:t\.me/|@)([a-z][0-9a-z_]{4,31})", text))
+    except Exception as e:
+        logger.warning(f"Get bypass index error: {e}", exc_info=True)
+
+    return result
+
+
 def get_config_text(config: dict) -> str:
     # Get config text
     result = ""
@@ -82,86 +135,69 @@ def get_config_text(config: dict) -> str:
     return result
 
 
-def get_description(client: Client, gid: int, cache: bool = True) -> str:
-    # Get group's description
-    result = ""
-    try:
-        group = get_group(client, gid, cache)
-
-        if group and group.description:
-            result = t2t(group.description, False, False)
-    except Exception as e:
-        logger.warning(f"Get description error: {e}", exc_info=True)
-
-    return result
-
-
 def get_group(client: Client, gid: int, cache: bool = True) -> Optional[Chat]:
-    # Get the group
+    # Get the group from the cache, refresh expired or missing entries in the background
     result = None
     try:
+        if not cache:
+            return get_chat(client, gid)
+
+        now = get_now()
         the_cache = glovar.chats.get(gid)
 
-        if the_cache:
-            result = the_cache
-        else:
-            result = get_chat(client, gid)
+        if not the_cache:
+            glovar.chats[gid] = {"chat": None, "until": now + glovar.time_retry}
+            thread(update_group, (client, gid))
+            return None
+
+        result = the_cache["chat"]
 
-        if cache and result:
-            glovar.chats[gid] = result
+        if now >= the_cache["until"]:
+            the_cache["until"] = now + glovar.time_retry
+            thread(update_group, (client, gid))
     except Exception as e:
         logger.warning(f"Get group error: {e}", exc_info=True)
 
     return result
 
 
-def get_group_sticker(client: Client, gid: int, cache: bool = True) -> str:
-    # Get group sticker set name
+def get_member(client: Client, gid: int, uid: int, cache: bool = True) -> str:
+    # Get a member's status in the group, return "left" if the user is not a member
     result = ""
-    try:
-        group = get_group(client, gid, cache)
-
-        if group and group.sticker_set_name:
-            result = group.sticker_set_name
-    except Exception as e:
-        logger.warning(f"Get group sticker error: {e}", exc_info=True)
-
-    return result
-
-
-def get_member(client: Client, gid: int, uid: int, cache: bool = True) -> Optional[ChatMember]:
-    # Get a member in the group
-    result = None
-
     try:
         if not init_group_id(gid):
-            return None
+            return ""
 
-        the_cache = glovar.members[gid].get(uid)
+        now = get_now()
+        members = glovar.members[gid]
 
-        if cache and the_cache:
-            return the_cache
+        with glovar.locks["member"]:
+            the_cache = members.get(uid)
 
-        result = get_chat_member(client, gid, uid)
+            # Keep the recently used members at the end
+            if cache and the_cache and the_cache[1] > now:
+                members.move_to_end(uid)
+                return the_cache[0]
 
-        if result:
-            glovar.members[gid][uid] = result
-    except Exception as e:
-        logger.warning(f"Get member error: {e}", exc_info=True)
+        member = get_chat_member(client, gid, uid)
 
-    return result
+        if member is False:
+            result = "left"
+        elif member:
+            result = member.status
+        else:
+            return ""
 
+        until = now + (glovar.time_left if result in {"kicked", "left"} else glovar.time_member)
 
-def get_pinned(client: Client, gid: int, cache: bool = True) -> Optional[Message]:
-    # Get group's pinned message
-    result = None
-    try:
-        group = get_group(client, gid, cache)
+        with glovar.locks["member"]:
+            members.pop(uid, None)
+            members[uid] = (result, until)
 
-        if group and group.pinned_message:
-            result = group.pinned_message
+            while len(members) > glovar.members_size:
+                members.popitem(last=False)
     except Exception as e:
-        logger.warning(f"Get pinned error: {e}", exc_info=True)
+        logger.warning(f"Get member error: {e}", exc_info=True)
 
     return result
 
@@ -179,19 +215,46 @@ def leave_group(client: Client, gid: int) -> bool:
         glovar.message_ids.pop(gid, {})
         save("message_ids")
 
-        glovar.trust_ids.pop(gid, set())
+        glovar.sticker_ids.pop(gid, None)
+        save("sticker_ids")
+
+        pop_trust_ids(gid)
         save("trust_ids")
 
         glovar.configs.pop(gid, {})
         save("configs")
 
-        glovar.declared_message_ids.pop(gid, set())
-        glovar.deleted_ids.pop(gid, set())
+        glovar.declared_message_ids.pop(gid, (0, 0))
+        glovar.join_rates.pop(gid, (0, 0))
+        glovar.deleted_ids.pop(gid, {})
         glovar.members.pop(gid, {})
-        glovar.recorded_ids.pop(gid, set())
+        glovar.recorded_ids.pop(gid, {})
 
         return True
     except Exception as e:
         logger.warning(f"Leave group error: {e}", exc_info=True)
 
     return False
+
+
+def update_group(client: Client, gid: int) -> Optional[Chat]:
+    # Update the group's cache
+    result = None
+    try:
+        result = get_chat(client, gid)
+
+        # Keep the old entry, retry soon
+        if not result:
+            the_cache = glovar.chats.get(gid)
+            the_cache and the_cache.update({"until": get_now() + glovar.time_retry})
+            return None
+
+        glovar.chats[gid] = {
+            "chat": result,
+            "until": get_now() + glovar.time_chat,
+            "bypass": get_bypass_index(result)
+        }
+    except Exception as e:
+        logger.warning(f"Update group error: {e}", exc_info=True)
+
+    return result
@@ -17,7 +17,13 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
+import re
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict, deque
 from copy import deepcopy
+from hashlib import blake2b
+from typing import Any, Dict, Iterable, List, Set, Union
 
 from .. import glovar
 from .file import save
@@ -26,6 +32,536 @@ from .file import save
 logger = logging.getLogger(__name__)
 
 
+def add_declared_id(gid: int, mid: int) -> bool:
+    # Add a declared message id to the group's window of recent message ids
+    try:
+        with glovar.locks["ids"]:
+            top, mask = glovar.declared_message_ids.get(gid, (0, 0))
+
+            if mid > top:
+                mask = ((mask << (mid - top)) | 1) & ((1 << glovar.declared_size) - 1)
+                top = mid
+            elif top - mid < glovar.declared_size:
+                mask |= 1 << (top - mid)
+            else:
+                return True
+
+            glovar.declared_message_ids[gid] = (top, mask)
+
+        return True
+    except Exception as e:
+        logger.warning(f"Add declared id error: {e}", exc_info=True)
+
+    return False
+
+
+def add_detected_content(content: Union[bytes, str], detection: str) -> bool:
+    # Add a detected content or url, evict the least recently used ones
+    try:
+        if not content or not detection:
+            return True
+
+        with glovar.locks["content"]:
+            glovar.contents[content] = detection
+            glovar.contents.move_to_end(content)
+
+            while len(glovar.contents) > glovar.contents_size:
+                glovar.contents.popitem(last=False)
+
+            glovar.contents_changed = True
+
+        return True
+    except Exception as e:
+        logger.warning(f"Add detected content error: {e}", exc_info=True)
+
+    return False
+
+
+def add_except_temp(content: Union[bytes, str]) -> bool:
+    # Add a content or image hash to the temp except list and its bloom filter
+    try:
+        if not content:
+            return True
+
+        key = get_except_key(content)
+
+        with glovar.locks["except"]:
+            for position in get_bloom_positions(key):
+                glovar.except_bloom[position >> 3] |= 1 << (position & 7)
+
+            glovar.except_db.execute("INSERT OR IGNORE INTO temp VALUES (?)", (key,))
+            glovar.except_changed = True
+
+        return True
+    except Exception as e:
+        logger.warning(f"Add except temp error: {e}", exc_info=True)
+
+    return False
+
+
+def add_id(ids: array, the_id: int) -> bool:
+    # Add an id to a sorted id array
+    try:
+        with glovar.locks["ids"]:
+            i = bisect_left(ids, the_id)
+
+            if i < len(ids) and ids[i] == the_id:
+                return True
+
+            ids.insert(i, the_id)
+
+        return True
+    except Exception as e:
+        logger.warning(f"Add id error: {e}", exc_info=True)
+
+    return False
+
+
+def add_sticker_id(gid: int, mid: int, now: int) -> bool:
+    # Schedule to delete a sticker or animation
+    try:
+        with glovar.locks["ids"]:
+            glovar.sticker_ids.setdefault(gid, deque()).append((mid, now))
+            glovar.sticker_changed = True
+
+        return True
+    except Exception as e:
+        logger.warning(f"Add sticker id error: {e}", exc_info=True)
+
+    return False
+
+
+def add_ttl_id(ids: Dict[int, int], the_id: int, now: int) -> bool:
+    # Add an id that expires after the cooldown time, keep the ids ordered by expiry
+    try:
+        with glovar.locks["ids"]:
+            ids.pop(the_id, 0)
+            ids[the_id] = now + glovar.time_cooldown
+
+        return True
+    except Exception as e:
+        logger.warning(f"Add ttl id error: {e}", exc_info=True)
+
+    return False
+
+
+def add_user_times(the_type: str, uids: Iterable[int], gid: int, now: int) -> bool:
+    # Add users' join or detected time in one batch, index the join time by time bucket
+    try:
+        with glovar.locks["ids"]:
+            status = glovar.user_ids[the_type]
+
+            for uid in uids:
+                status.setdefault(uid, {})[gid] = now
+
+            if the_type == "join":
+                glovar.user_buckets["join"].setdefault(now // glovar.time_bucket, set()).update(uids)
+
+        return True
+    except Exception as e:
+        logger.warning(f"Add user times error: {e}", exc_info=True)
+
+    return False
+
+
+def discard_detected_content(content: Union[bytes, str]) -> bool:
+    # Discard a detected content or url
+    try:
+        if not content:
+            return True
+
+        with glovar.locks["content"]:
+            if glovar.contents.pop(content, ""):
+                glovar.contents_changed = True
+
+        return True
+    except Exception as e:
+        logger.warning(f"Discard detected content error: {e}", exc_info=True)
+
+    return False
+
+
+def discard_except_temp(content: Union[bytes, str]) -> bool:
+    # Discard a content or image hash from the temp except list, the bloom filter just lets it through
+    try:
+        if not content:
+            return True
+
+        with glovar.locks["except"]:
+            glovar.except_db.execute("DELETE FROM temp WHERE content = ?", (get_except_key(content),))
+            glovar.except_changed = True
+
+        return True
+    except Exception as e:
+        logger.warning(f"Discard except temp error: {e}", exc_info=True)
+
+    return False
+
+
+def discard_id(ids: array, the_id: int) -> bool:
+    # Remove an id from a sorted id array
+    try:
+        with glovar.locks["ids"]:
+            i = bisect_left(ids, the_id)
+
+            if i < len(ids) and ids[i] == the_id:
+                ids.pop(i)
+
+        return True
+    except Exception as e:
+        logger.warning(f"Discard id error: {e}", exc_info=True)
+
+    return False
+
+
+def discard_user_times(the_type: str, uids: Iterable[int], gid: int) -> bool:
+    # Discard users' join or detected time in the group in one batch
+    try:
+        with glovar.locks["ids"]:
+            status = glovar.user_ids[the_type]
+
+            for uid in uids:
+                status.get(uid, {}).pop(gid, 0)
+
+        return True
+    except Exception as e:
+        logger.warning(f"Discard user times error: {e}", exc_info=True)
+
+    return False
+
+
+def get_bloom_positions(key: bytes) -> List[int]:
+    # Get the bit positions of a key in the bloom filter
+    result = []
+    try:
+        number = int.from_bytes(blake2b(key, digest_size=16).digest(), "big")
+        mask = glovar.bloom_size * 8 - 1
+        result = [(number >> (i * 32)) & mask for i in range(glovar.bloom_hashes)]
+    except Exception as e:
+        logger.warning(f"Get bloom positions error: {e}", exc_info=True)
+
+    return result
+
+
+def get_content_keys(contents: Set[Union[bytes, int, str]], keep: bool) -> Set[Union[bytes, int, str]]:
+    # Convert old content strings to fixed-size digest keys
+    result = set(contents)
+    try:
+        for content in [c for c in contents if isinstance(c, str)]:
+            result.add(blake2b(content.encode(), digest_size=16).digest())
+
+            if not keep and not re.search("^[0-9a-f]{32}$", content):
+                result.discard(content)
+    except Exception as e:
+        logger.warning(f"Get content keys error: {e}", exc_info=True)
+
+    return result
+
+
+def get_detected_content(content: Union[bytes, str]) -> str:
+    # Get the detection type of a content or url
+    result = ""
+    try:
+        if not content:
+            return ""
+
+        with glovar.locks["content"]:
+            result = glovar.contents.get(content, "")
+
+            if result:
+                glovar.contents.move_to_end(content)
+    except Exception as e:
+        logger.warning(f"Get detected content error: {e}", exc_info=True)
+
+    return result
+
+
+def get_except_key(content: Union[bytes, str]) -> bytes:
+    # Get the key of a content or image hash in the temp except list
+    result = b""
+    try:
+        result = content if isinstance(content, bytes) else content.encode()
+    except Exception as e:
+        logger.warning(f"Get except key error: {e}", exc_info=True)
+
+    return result
+
+
+def get_id_array(ids: Iterable[int]) -> array:
+    # Get a sorted id array from some ids
+    result = array("q")
+    try:
+        result = array("q", sorted(set(ids)))
+    except Exception as e:
+        logger.warning(f"Get id array error: {e}", exc_info=True)
+
+    return result
+
+
+def get_special_dict(words: Iterable[str]) -> Dict[str, str]:
+    # Get the special characters dictionary from the rules
+    result = {}
+    try:
+        for rule in words:
+            # Check keys
+            if "[" not in rule:
+                continue
+
+            # Check value
+            if "?#" not in rule:
+                continue
+
+            keys = rule.split("]")[0][1:]
+            value = rule.split("?#")[1][1]
+
+            for k in keys:
+                result[k] = value
+    except Exception as e:
+        logger.warning(f"Get special dict error: {e}", exc_info=True)
+
+    return result
+
+
+def get_trusted_ids(trust_ids: Dict[int, Set[int]]) -> Dict[int, int]:
+    # Get the count of trusting groups of each user, bots are always trusted
+    result = {}
+    try:
+        result = {uid: 1 for uid in glovar.bot_ids}
+
+        for gid in trust_ids:
+            for uid in trust_ids[gid]:
+                result[uid] = result.get(uid, 0) + 1
+    except Exception as e:
+        logger.warning(f"Get trusted ids error: {e}", exc_info=True)
+
+    return result
+
+
+def get_user_buckets(user_ids: dict) -> Dict[str, Dict[int, Set[int]]]:
+    # Get the time bucket index of users' join time
+    result = {
+        "join": {}
+    }
+    try:
+        for uid in user_ids["join"]:
+            for time in user_ids["join"][uid].values():
+                result["join"].setdefault(time // glovar.time_bucket, set()).add(uid)
+    except Exception as e:
+        logger.warning(f"Get user buckets error: {e}", exc_info=True)
+
+    return result
+
+
+def get_user_data(users: Dict[int, Dict[str, Dict[Union[int, str], Union[float, int]]]]) -> dict:
+    # Get the columnar user data from user status dicts
+    result = {
+        "detected": {},
+        "join": {},
+        "rows": {},
+        "score": array("d"),
+        "total": array("d")
+    }
+    try:
+        for uid in users:
+            scores = [float(users[uid].get("score", {}).get(p, 0.0)) for p in glovar.score_types]
+            result["rows"][uid] = len(result["total"])
+            result["score"].extend(scores)
+            result["total"].append(sum(scores))
+
+            for key in ["detected", "join"]:
+                if users[uid].get(key):
+                    result[key][uid] = dict(users[uid][key])
+    except Exception as e:
+        logger.warning(f"Get user data error: {e}", exc_info=True)
+
+    return result
+
+
+def get_user_score(uid: int, project: str = "") -> float:
+    # Get a user's score of the project, or the total score
+    result = 0.0
+    try:
+        user_ids = glovar.user_ids
+        row = user_ids["rows"].get(uid)
+
+        if row is None:
+            return 0.0
+
+        if not project:
+            return user_ids["total"][row]
+
+        if project not in glovar.score_types:
+            return 0.0
+
+        result = user_ids["score"][row * len(glovar.score_types) + glovar.score_types.index(project)]
+    except Exception as e:
+        logger.warning(f"Get user score error: {e}", exc_info=True)
+
+    return result
+
+
+def get_valid_data(the_type: str, data: Any) -> Any:
+    # Validate the data of a global variable, return the complete data or None
+    result = None
+    try:
+        if the_type not in glovar.file_list:
+            return None
+
+        current = eval(f"glovar.{the_type}")
+
+        # Convert old id lists
+        if the_type == "bad_ids" and isinstance(data, dict) and isinstance(data.get("users"), set):
+            data["users"] = get_id_array(data["users"])
+        elif the_type == "watch_ids" and isinstance(data, dict):
+            for key in [k for k in data if isinstance(data[k], dict) and "ids" not in data[k]]:
+                data[key] = get_watch_data(data[key])
+        elif the_type == "white_ids" and isinstance(data, set):
+            data = get_id_array(data)
+        elif the_type == "user_ids" and isinstance(data, dict) and all(isinstance(uid, int) for uid in data):
+            if any(not isinstance(data[uid], dict) for uid in data):
+                return None
+
+            data = get_user_data(data)
+
+        if not isinstance(data, type(current)):
+            return None
+
+        # Lists with fixed keys
+        if the_type in {"bad_ids", "except_ids", "user_ids", "watch_ids"}:
+            if set(data) != set(current):
+                return None
+
+            if any(not isinstance(data[key], type(current[key])) for key in current):
+                return None
+
+            if the_type == "watch_ids" and any(len(data[key]["ids"]) != len(data[key]["until"]) for key in data):
+                return None
+
+            if the_type == "user_ids" and (len(data["score"]) != len(data["total"]) * len(glovar.score_types)
+                                           or any(row >= len(data["total"]) for row in data["rows"].values())):
+                return None
+
+            if the_type == "except_ids":
+                data["long"] = get_content_keys(data["long"], True)
+                data["temp"] = get_content_keys(data["temp"], False)
+
+        # Group lists
+        elif the_type in {"admin_ids", "trust_ids"}:
+            if any(not isinstance(gid, int) or not isinstance(data[gid], set) for gid in data):
+                return None
+
+        # Group configs
+        elif the_type == "configs":
+            if any(not isinstance(gid, int) or not isinstance(data[gid], dict) for gid in data):
+                return None
+
+            data = {gid: {**deepcopy(glovar.default_config), **data[gid]} for gid in data}
+
+        # Group messages
+        elif the_type == "message_ids":
+            if any(not isinstance(gid, int) or not isinstance(data[gid], dict) for gid in data):
+                return None
+
+            data = {gid: {**deepcopy(glovar.default_message_data), **data[gid]} for gid in data}
+
+            for gid in data:
+                data[gid].pop("stickers", {})
+
+        # Scheduled stickers
+        elif the_type == "sticker_ids":
+            if any(not isinstance(gid, int) or not isinstance(data[gid], deque) for gid in data):
+                return None
+
+        # Detected contents
+        elif the_type == "contents":
+            data = OrderedDict(list(data.items())[-glovar.contents_size:])
+
+        # Regex words
+        elif the_type.endswith("_words"):
+            if any(not isinstance(word, str) or not isinstance(data[word], dict) for word in data):
+                return None
+
+        result = data
+    except Exception as e:
+        logger.warning(f"Get valid data error: {e}", exc_info=True)
+
+    return result
+
+
+def get_watch_data(watch: Dict[int, int]) -> Dict[str, array]:
+    # Get the compact watch data from a watch dict
+    result = {
+        "ids": array("q"),
+        "until": array("q")
+    }
+    try:
+        uids = sorted(watch)
+        result["ids"] = array("q", uids)
+        result["until"] = array("q", [watch[uid] for uid in uids])
+    except Exception as e:
+        logger.warning(f"Get watch data error: {e}", exc_info=True)
+
+    return result
+
+
+def get_watch_until(the_type: str, uid: int) -> int:
+    # Get the watch status of a user
+    result = 0
+    try:
+        watch = glovar.watch_ids[the_type]
+        i = bisect_left(watch["ids"], uid)
+
+        if i < len(watch["ids"]) and watch["ids"][i] == uid:
+            result = watch["until"][i]
+    except Exception as e:
+        logger.warning(f"Get watch until error: {e}", exc_info=True)
+
+    return result
+
+
+def has_except_temp(content: Union[bytes, str]) -> bool:
+    # Check the temp except list, ask the bloom filter first
+    try:
+        if not content:
+            return False
+
+        key = get_except_key(content)
+        bloom = glovar.except_bloom
+
+        for position in get_bloom_positions(key):
+            if not bloom[position >> 3] & (1 << (position & 7)):
+                return False
+
+        with glovar.locks["except"]:
+            return glovar.except_db.execute("SELECT 1 FROM temp WHERE content = ?", (key,)).fetchone() is not None
+    except Exception as e:
+        logger.warning(f"Has except temp error: {e}", exc_info=True)
+
+    return False
+
+
+def has_id(ids: array, the_id: int) -> bool:
+    # Check if the id is in a sorted id array
+    try:
+        i = bisect_left(ids, the_id)
+
+        return i < len(ids) and ids[i] == the_id
+    except Exception as e:
+        logger.warning(f"Has id error: {e}", exc_info=True)
+
+    return False
+
+
+def has_ttl_id(ids: Dict[int, int], the_id: int, now: int) -> bool:
+    # Check if the id is in the ids and not expired
+    try:
+        return ids.get(the_id, 0) > now
+    except Exception as e:
+        logger.warning(f"Has ttl id error: {e}", exc_info=True)
+
+    return False
+
+
 def init_group_id(gid: int) -> bool:
     # Init group data
     try:
@@ -52,16 +588,16 @@ def init_group_id(gid: int) -> bool:
             save("configs")
 
         if glovar.declared_message_ids.get(gid) is None:
-            glovar.declared_message_ids[gid] = set()
+            glovar.declared_message_ids[gid] = (0, 0)
 
         if glovar.deleted_ids.get(gid) is None:
-            glovar.deleted_ids[gid] = set()
+            glovar.deleted_ids[gid] = {}
 
         if glovar.members.get(gid) is None:
-            glovar.members[gid] = {}
+            glovar.members[gid] = OrderedDict()
 
         if glovar.recorded_ids.get(gid) is None:
-            glovar.recorded_ids[gid] = set()
+            glovar.recorded_ids[gid] = {}
 
         return True
     except Exception as e:
@@ -71,14 +607,287 @@ def init_group_id(gid: int) -> bool:
 
 
 def init_user_id(uid: int) -> bool:
-    # Init user data
+    # Init user data, give the user a score row
     try:
-        if glovar.user_ids.get(uid) is None:
-            glovar.user_ids[uid] = deepcopy(glovar.default_user_status)
-            save("user_ids")
+        with glovar.locks["ids"]:
+            if glovar.user_ids["rows"].get(uid) is not None:
+                return True
+
+            glovar.user_ids["rows"][uid] = len(glovar.user_ids["total"])
+            glovar.user_ids["score"].extend([0.0] * len(glovar.score_types))
+            glovar.user_ids["total"].append(0.0)
+
+        save("user_ids")
 
         return True
     except Exception as e:
         logger.warning(f"Init user id {uid} error: {e}", exc_info=True)
 
     return False
+
+
+def pop_sticker_ids(gid: int, until: int) -> List[int]:
+    # Pop the scheduled stickers and animations sent before the time
+    result = []
+    try:
+        with glovar.locks["ids"]:
+            sticker_ids = glovar.sticker_ids.get(gid, deque())
+
+            while sticker_ids and sticker_ids[0][1] <= until:
+                result.append(sticker_ids.popleft()[0])
+
+            glovar.sticker_changed = glovar.sticker_changed or bool(result)
+    except Exception as e:
+        logger.warning(f"Pop sticker ids error: {e}", exc_info=True)
+
+    return result
+
+
+def pop_trust_ids(gid: int) -> bool:
+    # Remove a group's trust list, update the trusted users
+    try:
+        with glovar.locks["ids"]:
+            for uid in glovar.trust_ids.pop(gid, set()):
+                count = glovar.trusted_ids.get(uid, 0) - 1
+
+                if count > 0:
+                    glovar.trusted_ids[uid] = count
+                else:
+                    glovar.trusted_ids.pop(uid, 0)
+
+        return True
+    except Exception as e:
+        logger.warning(f"Pop trust ids error: {e}", exc_info=True)
+
+    return False
+
+
+def pop_watch(the_type: str, uid: int) -> bool:
+    # Remove a user's watch status
+    try:
+        with glovar.locks["ids"]:
+            watch = glovar.watch_ids[the_type]
+            i = bisect_left(watch["ids"], uid)
+
+            if i < len(watch["ids"]) and watch["ids"][i] == uid:
+                watch["ids"].pop(i)
+                watch["until"].pop(i)
+
+        return True
+    except Exception as e:
+        logger.warning(f"Pop watch error: {e}", exc_info=True)
+
+    return False
+
+
+def prune_ttl_ids(ids: Dict[int, int], now: int) -> bool:
+    # Remove the expired ids from the front of the ids
+    try:
+        with glovar.locks["ids"]:
+            while ids:
+                the_id = next(iter(ids))
+
+                if ids[the_id] > now:
+                    break
+
+                ids.pop(the_id, 0)
+
+        return True
+    except Exception as e:
+        logger.warning(f"Prune ttl ids error: {e}", exc_info=True)
+
+    return False
+
+
+def prune_user_data(now: int) -> bool:
+    # Remove expired join time, free the score rows of idle users
+    result = False
+    try:
+        # The detected time is kept until the monthly reset, the score is counted from it
+        expire = now - max(glovar.time_new, glovar.time_short, glovar.time_track)
+
+        with glovar.locks["ids"]:
+            idle = set()
+
+            # Only visit the users in expired buckets
+            buckets = glovar.user_buckets["join"]
+
+            for bucket in [b for b in buckets if (b + 1) * glovar.time_bucket <= expire]:
+                for uid in buckets.pop(bucket):
+                    status = glovar.user_ids["join"].get(uid, {})
+
+                    for gid in [g for g in status if status[g] <= expire]:
+                        status.pop(gid, 0)
+
+                    if status:
+                        continue
+
+                    glovar.user_ids["join"].pop(uid, {})
+                    idle.add(uid)
+
+                result = True
+
+            idle = {uid for uid in idle
+                    if not glovar.user_ids["detected"].get(uid)
+                    and not glovar.user_ids["join"].get(uid)
+                    and glovar.user_ids["rows"].get(uid) is not None
+                    and not glovar.user_ids["total"][glovar.user_ids["rows"][uid]]}
+
+            if not idle:
+                return result
+
+            # Compact the score columns
+            size = len(glovar.score_types)
+            rows = {}
+            score = array("d")
+            total = array("d")
+
+            for uid, row in glovar.user_ids["rows"].items():
+                if uid in idle:
+                    continue
+
+                rows[uid] = len(total)
+                score.extend(glovar.user_ids["score"][row * size:(row + 1) * size])
+                total.append(glovar.user_ids["total"][row])
+
+            glovar.user_ids = {**glovar.user_ids, "rows": rows, "score": score, "total": total}
+    except Exception as e:
+        logger.warning(f"Prune user data error: {e}", exc_info=True)
+
+    return result
+
+
+def reset_except_temp() -> bool:
+    # Clear the temp except list and its bloom filter
+    try:
+        with glovar.locks["except"]:
+            glovar.except_db.execute("DELETE FROM temp")
+            glovar.except_db.commit()
+            glovar.except_bloom = bytearray(glovar.bloom_size)
+            glovar.except_changed = False
+
+        return True
+    except Exception as e:
+        logger.warning(f"Reset except temp error: {e}", exc_info=True)
+
+    return False
+
+
+def reset_user_id(uid: int) -> bool:
+    # Reset a user's scores and status
+    try:
+        with glovar.locks["ids"]:
+            glovar.user_ids["detected"].pop(uid, {})
+            glovar.user_ids["join"].pop(uid, {})
+            row = glovar.user_ids["rows"].get(uid)
+
+            if row is None:
+                return True
+
+            size = len(glovar.score_types)
+            glovar.user_ids["score"][row * size:(row + 1) * size] = array("d", [0.0] * size)
+            glovar.user_ids["total"][row] = 0.0
+
+        return True
+    except Exception as e:
+        logger.warning(f"Reset user id error: {e}", exc_info=True)
+
+    return False
+
+
+def reset_user_scores() -> bool:
+    # Reset all users' scores and detected time, keep their join time
+    try:
+        with glovar.locks["ids"]:
+            glovar.user_ids = {**glovar.user_ids, "detected": {}, "rows": {}, "score": array("d"), "total": array("d")}
+
+        return True
+    except Exception as e:
+        logger.warning(f"Reset user scores error: {e}", exc_info=True)
+
+    return False
+
+
+def set_trust_ids(gid: int, uids: Set[int]) -> bool:
+    # Set a group's trust list, update the trusted users
+    try:
+        with glovar.locks["ids"]:
+            previous = glovar.trust_ids.get(gid, set())
+            glovar.trust_ids[gid] = uids
+
+            for uid in uids - previous:
+                glovar.trusted_ids[uid] = glovar.trusted_ids.get(uid, 0) + 1
+
+            for uid in previous - uids:
+                count = glovar.trusted_ids.get(uid, 0) - 1
+
+                if count > 0:
+                    glovar.trusted_ids[uid] = count
+                else:
+                    glovar.trusted_ids.pop(uid, 0)
+
+        return True
+    except Exception as e:
+        logger.warning(f"Set trust ids error: {e}", exc_info=True)
+
+    return False
+
+
+def set_user_score(uid: int, project: str, score: float) -> bool:
+    # Set a user's score of the project, update the total score
+    try:
+        if project not in glovar.score_types:
+            return False
+
+        if not init_user_id(uid):
+            return False
+
+        with glovar.locks["ids"]:
+            row = glovar.user_ids["rows"][uid]
+            size = len(glovar.score_types)
+            glovar.user_ids["score"][row * size + glovar.score_types.index(project)] = score
+            glovar.user_ids["total"][row] = sum(glovar.user_ids["score"][row * size:(row + 1) * size])
+
+        return True
+    except Exception as e:
+        logger.warning(f"Set user score error: {e}", exc_info=True)
+
+    return False
+
+
+def set_watch_until(the_type: str, uid: int, until: int) -> bool:
+    # Set a user's watch status
+    try:
+        with glovar.locks["ids"]:
+            watch = glovar.watch_ids[the_type]
+            i = bisect_left(watch["ids"], uid)
+
+            if i < len(watch["ids"]) and watch["ids"][i] == uid:
+                watch["until"][i] = until
+            else:
+                watch["ids"].insert(i, uid)
+                watch["until"].insert(i, until)
+
+        return True
+    except Exception as e:
+        logger.warning(f"Set watch until error: {e}", exc_info=True)
+
+    return False
+
+
+def update_join_rate(gid: int, count: int, now: int) -> int:
+    # Count the joins of the group in the current raid window
+    result = 0
+    try:
+        with glovar.locks["ids"]:
+            start, total = glovar.join_rates.get(gid, (0, 0))
+
+            if now - start >= glovar.time_raid:
+                start, total = now, 0
+
+            result = total + count
+            glovar.join_rates[gid] = (start, result)
+    except Exception as e:
+        logger.warning(f"Update join rate error: {e}", exc_info=True)
+
+    return result
@@ -17,14 +17,15 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
 
-from PIL import Image, ImageEnhance
 from pyrogram import Client, Message
-from pyzbar.pyzbar import decode
 
 from .. import glovar
-from .etc import get_md5sum, t2t, thread
-from .file import delete_file, get_downloaded_path
+from .etc import get_md5sum, t2t
+from .file import get_downloaded_data
+from .qrcode import get_qrcode_data
 
 # Enable logging
 logger = logging.getLogger(__name__)
@@ -95,50 +96,66 @@ def get_image_hash(client: Client, message: Message) -> str:
         if not file_id:
             return ""
 
-        image_path = get_downloaded_path(client, file_id, file_ref)
+        image_data = get_downloaded_data(client, file_id, file_ref)
 
-        if not image_path:
+        if not image_data:
             return ""
 
-        result = get_md5sum("file", image_path)
-        thread(delete_file, (image_path,))
+        result = get_md5sum("bytes", image_data)
     except Exception as e:
         logger.warning(f"Get image hash error: {e}", exc_info=True)
 
     return result
 
 
-def get_qrcode(path: str) -> str:
-    # Get QR code
+def get_qrcode(data: bytes) -> str:
+    # Get QR code from the decoding processes
     result = ""
     try:
-        if not path:
+        if not data:
             return ""
 
-        # Open
-        image = Image.open(path)
+        executor = glovar.qrcode_executor
+        future = executor.submit(get_qrcode_data, data, glovar.qrcode_pixels, glovar.qrcode_size, glovar.qrcode_table)
+
+        try:
+            result = future.result(timeout=glovar.time_qrcode)
+            result = result and t2t(result, False, False)
+        except TimeoutError:
+            # The decode may be stuck in a worker, replace the pool
+            logger.warning(f"Get qrcode timeout: {len(data)} bytes")
+            start_qrcode_pool(executor)
+        except BrokenProcessPool:
+            logger.warning(f"Get qrcode pool broken: {len(data)} bytes")
+            start_qrcode_pool(executor)
+    except Exception as e:
+        logger.warning(f"Get qrcode error: {e}", exc_info=True)
+
+    return result
 
-        # Gray
-        image = image.convert("L")
 
-        # Contrast
-        image = ImageEnhance.Contrast(image).enhance(4.0)
+def start_qrcode_pool(broken: ProcessPoolExecutor = None) -> bool:
+    # Start the decoding processes, or replace a broken or stuck pool
+    try:
+        with glovar.locks["qrcode"]:
+            if broken and broken is not glovar.qrcode_executor:
+                return True
+
+            if broken:
+                # Kill the workers, a stuck decode does not stop on shutdown
+                processes = list((broken._processes or {}).values())
+                broken.shutdown(wait=False)
 
-        # Thresholding
-        image = image.point(lambda x: 0 if x < 150 else 255)
+                for process in processes:
+                    process.terminate()
 
-        # Decode
-        decoded_list = decode(image)
+                glovar.qrcode_executor = ProcessPoolExecutor(max_workers=glovar.qrcode_workers,
+                                                             mp_context=glovar.qrcode_context)
 
-        if decoded_list:
-            for decoded in decoded_list:
-                if decoded.type == "QRCODE":
-                    result += f"{decoded.data}\n"
+            glovar.qrcode_executor.submit(get_qrcode_data, b"", 0, 0, []).result()
 
-            if result:
-                result = result[:-1]
-                result = t2t(result, False, False)
+        return True
     except Exception as e:
-        logger.warning(f"Get qrcode error: {e}", exc_info=True)
+        logger.warning(f"Start qrcode pool error: {e}", exc_info=True)
 
-    return result
+    return False
@@ -0,0 +1,70 @@
+# SCP-079-CLEAN - Filter specific types of messages
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-CLEAN.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+from io import BytesIO
+from typing import List
+
+from PIL import Image, ImageEnhance
+from pyzbar.pyzbar import decode
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+
+def get_qrcode_data(data: bytes, pixels: int, size: int, table: List[int]) -> str:
+    # Decode QR code in a decoding process, do not import glovar in this module
+    result = ""
+    try:
+        if not data:
+            return ""
+
+        # Open
+        image = Image.open(BytesIO(data))
+
+        # Size cap
+        if image.width * image.height > pixels:
+            return ""
+
+        # Downscale while decoding, and again after
+        image.draft("L", (size, size))
+        image.thumbnail((size, size))
+
+        # Gray
+        image = image.convert("L")
+
+        # Contrast
+        image = ImageEnhance.Contrast(image).enhance(4.0)
+
+        # Thresholding
+        image = image.point(table)
+
+        # Decode
+        decoded_list = decode(image)
+
+        if decoded_list:
+            for decoded in decoded_list:
+                if decoded.type == "QRCODE":
+                    result += f"{decoded.data}\n"
+
+            if result:
+                result = result[:-1]
+    except Exception as e:
+        logger.warning(f"Get qrcode data error: {e}", exc_info=True)
+
+    return result
@@ -17,8 +17,8 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
-import pickle
-from copy import deepcopy
+from array import array
+from io import BytesIO
 from json import loads
 from typing import Any
 
@@ -28,10 +28,14 @@ from .. import glovar
 from .channel import get_content, get_debug_text, share_data
 from .etc import code, crypt_str, general_link, get_int, get_now, get_report_record, get_stripped_link, get_text, lang
 from .etc import mention_id, thread
-from .file import crypt_file, data_to_file, delete_file, get_new_path, get_downloaded_path, save
+from .file import bytes_to_data, crypt_bytes, crypt_file, data_to_file, delete_file, file_to_data
+from .file import get_downloaded_data, get_downloaded_path, get_new_path, save
 from .filters import is_class_e, is_declared_message_id, is_detected_user_id, is_not_allowed
 from .group import get_config_text, leave_group
-from .ids import init_group_id, init_user_id
+from .ids import add_declared_id, add_detected_content, add_except_temp, add_id, discard_detected_content
+from .ids import discard_except_temp, discard_id, get_id_array, get_special_dict, get_trusted_ids, get_user_buckets
+from .ids import get_user_data, get_valid_data, get_watch_data, init_group_id, pop_watch, reset_except_temp
+from .ids import reset_user_id, set_user_score, set_watch_until
 from .image import get_image_hash
 from .telegram import get_messages, send_message, send_report_message
 from .timers import update_admins
@@ -54,7 +58,7 @@ def receive_add_bad(sender: str, data: dict) -> bool:
 
         # Receive bad user
         if the_type == "user":
-            glovar.bad_ids["users"].add(the_id)
+            add_id(glovar.bad_ids["users"], the_id)
 
         save("bad_ids")
 
@@ -103,13 +107,17 @@ def receive_add_except(client: Client, data: dict) -> bool:
             content = get_content(message)
 
             if content:
-                glovar.except_ids[the_type].add(content)
-                glovar.contents.pop(content, "")
+                if the_type == "temp":
+                    add_except_temp(content)
+                else:
+                    glovar.except_ids["long"].add(content)
+
+                discard_detected_content(content)
 
             image_hash = get_image_hash(client, message)
 
             if image_hash:
-                glovar.except_ids["temp"].add(image_hash)
+                add_except_temp(image_hash)
 
         save("except_ids")
 
@@ -160,10 +168,10 @@ def receive_captcha_kicked_user(data: dict) -> bool:
             return False
 
         # Check user status
-        if not glovar.user_ids.get(uid, {}):
+        if not glovar.user_ids["join"].get(uid, {}):
             return True
 
-        glovar.user_ids[uid]["join"].pop(gid, 0)
+        glovar.user_ids["join"][uid].pop(gid, 0)
         save("user_ids")
 
         result = True
@@ -194,7 +202,7 @@ def receive_captcha_kicked_users(client: Client, message: Message, data: int) ->
 
         # Remove group status
         for uid in uids:
-            glovar.user_ids.get(uid, {}) and glovar.user_ids[uid]["join"].pop(gid, 0)
+            glovar.user_ids["join"].get(uid, {}).pop(gid, 0)
 
         save("user_ids")
 
@@ -220,7 +228,7 @@ def receive_clear_data(client: Client, data_type: str, data: dict) -> bool:
             if the_type == "channels":
                 glovar.bad_ids["channels"] = set()
             elif the_type == "users":
-                glovar.bad_ids["users"] = set()
+                glovar.bad_ids["users"] = array("q")
 
             save("bad_ids")
 
@@ -231,17 +239,18 @@ def receive_clear_data(client: Client, data_type: str, data: dict) -> bool:
             elif the_type == "long":
                 glovar.except_ids["long"] = set()
             elif the_type == "temp":
-                glovar.except_ids["temp"] = set()
+                reset_except_temp()
 
             save("except_ids")
 
         # Clear user data
         if data_type == "user":
             if the_type == "all":
-                glovar.user_ids = {}
+                glovar.user_ids = get_user_data({})
+                glovar.user_buckets = get_user_buckets(glovar.user_ids)
             elif the_type == "new":
-                for uid in list(glovar.user_ids):
-                    glovar.user_ids[uid]["join"] = {}
+                glovar.user_ids["join"] = {}
+                glovar.user_buckets["join"] = {}
 
             save("user_ids")
 
@@ -249,13 +258,13 @@ def receive_clear_data(client: Client, data_type: str, data: dict) -> bool:
         if data_type == "watch":
             if the_type == "all":
                 glovar.watch_ids = {
-                    "ban": {},
-                    "delete": {}
+                    "ban": get_watch_data({}),
+                    "delete": get_watch_data({})
                 }
             elif the_type == "ban":
-                glovar.watch_ids["ban"] = {}
+                glovar.watch_ids["ban"] = get_watch_data({})
             elif the_type == "delete":
-                glovar.watch_ids["delete"] = {}
+                glovar.watch_ids["delete"] = get_watch_data({})
 
             save("watch_ids")
 
@@ -372,7 +381,7 @@ def receive_declared_message(data: dict) -> bool:
             return True
 
         if init_group_id(gid):
-            glovar.declared_message_ids[gid].add(mid)
+            add_declared_id(gid, mid)
 
         return True
     except Exception as e:
@@ -390,6 +399,32 @@ def receive_file_data(client: Client, message: Message, decrypt: bool = True) ->
 
         file_id = message.document.file_id
         file_ref = message.document.file_ref
+        file_size = message.document.file_size or 0
+
+        # Large file, use the tmp directory
+        if file_size > glovar.memory_size:
+            return receive_file_path_data(client, file_id, file_ref, decrypt)
+
+        # Small file, decrypt and load it in memory
+        file_data = get_downloaded_data(client, file_id, file_ref)
+
+        if not file_data:
+            return None
+
+        if decrypt:
+            file_data = crypt_bytes("decrypt", file_data)
+
+        data = bytes_to_data(file_data)
+    except Exception as e:
+        logger.warning(f"Receive file error: {e}", exc_info=True)
+
+    return data
+
+
+def receive_file_path_data(client: Client, file_id: str, file_ref: str, decrypt: bool = True) -> Any:
+    # Receive large file's data through the tmp directory
+    data = None
+    try:
         path = get_downloaded_path(client, file_id, file_ref)
 
         if not path:
@@ -405,13 +440,12 @@ def receive_file_data(client: Client, message: Message, decrypt: bool = True) ->
             path_decrypted = ""
             path_final = path
 
-        with open(path_final, "rb") as f:
-            data = pickle.load(f)
+        data = file_to_data(path_final)
 
         for f in {path, path_decrypted}:
             thread(delete_file, (f,))
     except Exception as e:
-        logger.warning(f"Receive file error: {e}", exc_info=True)
+        logger.warning(f"Receive file path data error: {e}", exc_info=True)
 
     return data
 
@@ -428,10 +462,8 @@ def receive_flood_score(client: Client, message: Message) -> bool:
         if users is None:
             return False
 
-        user_list = [uid for uid in list(users) if init_user_id(uid)]
-
-        for uid in user_list:
-            glovar.user_ids[uid]["score"]["captcha"] = users[uid]
+        for uid in list(users):
+            set_user_score(uid, "captcha", users[uid])
 
         save("user_ids")
     except Exception as e:
@@ -504,10 +536,11 @@ def receive_preview(client: Client, message: Message, data: dict) -> bool:
         image = preview["image"]
 
         if image:
-            image_path = get_new_path()
-            image.save(image_path, "PNG")
+            image_file = BytesIO()
+            image.save(image_file, "PNG")
+            image_data = image_file.getvalue()
         else:
-            image_path = None
+            image_data = None
 
         # Check status
         if is_declared_message_id(gid, mid) or is_detected_user_id(gid, uid, now):
@@ -520,13 +553,13 @@ def receive_preview(client: Client, message: Message, data: dict) -> bool:
             return True
 
         # Detect
-        detection = is_not_allowed(client, the_message, text, image_path)
+        detection = is_not_allowed(client, the_message, text, image_data)
 
         if detection:
             result = terminate_user(client, the_message, detection)
 
             if result and url and detection != "true" and detection in glovar.types["spam"]:
-                glovar.contents[url] = detection
+                add_detected_content(url, detection)
 
         return True
     except Exception as e:
@@ -585,27 +618,15 @@ def receive_regex(client: Client, message: Message, data: str) -> bool:
 
         save(file_name)
 
+        # Expire the cached verdicts
+        glovar.regex_generation += 1
+
         # Regenerate special characters dictionary if possible
         if file_name not in {"spc_words", "spe_words"}:
             return True
 
         special = file_name.split("_")[0]
-        exec(f"glovar.{special}_dict = {{}}")
-
-        for rule in words_data:
-            # Check keys
-            if "[" not in rule:
-                continue
-
-            # Check value
-            if "?#" not in rule:
-                continue
-
-            keys = rule.split("]")[0][1:]
-            value = rule.split("?#")[1][1]
-
-            for k in keys:
-                eval(f"glovar.{special}_dict")[k] = value
+        setattr(glovar, f"{special}_dict", get_special_dict(words_data))
 
         return True
     except Exception as e:
@@ -629,11 +650,11 @@ def receive_remove_bad(data: dict) -> bool:
 
         # Remove bad user
         if the_type == "user":
-            glovar.bad_ids["users"].discard(the_id)
-            glovar.watch_ids["ban"].pop(the_id, {})
-            glovar.watch_ids["delete"].pop(the_id, {})
+            discard_id(glovar.bad_ids["users"], the_id)
+            pop_watch("ban", the_id)
+            pop_watch("delete", the_id)
             save("watch_ids")
-            glovar.user_ids[the_id] = deepcopy(glovar.default_user_status)
+            reset_user_id(the_id)
             save("user_ids")
 
         save("bad_ids")
@@ -686,12 +707,15 @@ def receive_remove_except(client: Client, data: dict) -> bool:
             content = get_content(message)
 
             if content:
-                glovar.except_ids[the_type].discard(content)
+                if the_type == "temp":
+                    discard_except_temp(content)
+                else:
+                    glovar.except_ids["long"].discard(content)
 
             image_hash = get_image_hash(client, message)
 
             if image_hash:
-                glovar.except_ids["temp"].discard(image_hash)
+                discard_except_temp(image_hash)
 
         save("except_ids")
 
@@ -709,10 +733,12 @@ def receive_remove_score(data: int) -> bool:
         # Basic data
         uid = data
 
-        if not glovar.user_ids.get(uid):
+        if (glovar.user_ids["rows"].get(uid) is None
+                and not glovar.user_ids["detected"].get(uid)
+                and not glovar.user_ids["join"].get(uid)):
             return True
 
-        glovar.user_ids[uid] = deepcopy(glovar.default_user_status)
+        reset_user_id(uid)
         save("user_ids")
 
         return True
@@ -731,8 +757,8 @@ def receive_remove_watch(data: int) -> bool:
         uid = data
 
         # Reset watch status
-        glovar.watch_ids["ban"].pop(uid, 0)
-        glovar.watch_ids["delete"].pop(uid, 0)
+        pop_watch("ban", uid)
+        pop_watch("delete", uid)
         save("watch_ids")
 
         return True
@@ -748,11 +774,8 @@ def receive_remove_white(data: int) -> bool:
         # Basic data
         uid = data
 
-        if not init_user_id(uid):
-            return True
-
         # White ids
-        glovar.white_ids.discard(uid)
+        discard_id(glovar.white_ids, uid)
         save("white_ids")
 
         return True
@@ -773,7 +796,48 @@ def receive_rollback(client: Client, message: Message, data: dict) -> bool:
         if not the_data:
             return True
 
-        exec(f"glovar.{the_type} = the_data")
+        # Get the file from the backup archive
+        if isinstance(the_data, dict) and isinstance(the_data.get(glovar.archive_key), dict):
+            archive = the_data[glovar.archive_key]
+
+            if not isinstance(archive.get(the_type), bytes):
+                return True
+
+            the_data = bytes_to_data(archive[the_type])
+
+        # Validate the data before it becomes visible
+        the_data = get_valid_data(the_type, the_data)
+
+        if not the_data:
+            return True
+
+        # Build the derived data
+        derived = {}
+
+        if the_type in {"spc_words", "spe_words"}:
+            derived[f"{the_type.split('_')[0]}_dict"] = get_special_dict(the_data)
+        elif the_type == "trust_ids":
+            derived["trusted_ids"] = get_trusted_ids(the_data)
+        elif the_type == "user_ids":
+            derived["user_buckets"] = get_user_buckets(the_data)
+
+        # Move the old temp except list to the on-disk exact set
+        if the_type == "except_ids":
+            for content in the_data["temp"]:
+                add_except_temp(content)
+
+            the_data["temp"] = set()
+
+        # Swap the references
+        setattr(glovar, the_type, the_data)
+
+        for name in derived:
+            setattr(glovar, name, derived[name])
+
+        # Expire the cached verdicts of the old rules
+        if the_type.endswith("_words"):
+            glovar.regex_generation += 1
+
         save(the_type)
 
         # Send debug message
@@ -782,6 +846,8 @@ def receive_rollback(client: Client, message: Message, data: dict) -> bool:
                 f"{lang('action')}{lang('colon')}{code(lang('rollback'))}\n"
                 f"{lang('more')}{lang('colon')}{code(the_type)}\n")
         thread(send_message, (client, glovar.debug_channel_id, text))
+
+        return True
     except Exception as e:
         logger.warning(f"Receive rollback error: {e}", exc_info=True)
 
@@ -813,11 +879,8 @@ def receive_user_score(project: str, data: dict) -> bool:
         project = project.lower()
         uid = data["id"]
 
-        if not init_user_id(uid):
-            return True
-
         score = data["score"]
-        glovar.user_ids[uid]["score"][project] = score
+        set_user_score(uid, project, score)
         save("user_ids")
 
         return True
@@ -842,10 +905,8 @@ def receive_watch_user(data: dict) -> bool:
         until = get_int(until)
 
         # Add to list
-        if the_type == "ban":
-            glovar.watch_ids["ban"][uid] = until
-        elif the_type == "delete":
-            glovar.watch_ids["delete"][uid] = until
+        if the_type in {"ban", "delete"}:
+            set_watch_until(the_type, uid, until)
         else:
             return False
 
@@ -866,7 +927,7 @@ def receive_white_users(client: Client, message: Message) -> bool:
         if not the_data:
             return True
 
-        glovar.white_ids = the_data
+        glovar.white_ids = get_id_array(the_data)
         save("white_ids")
     except Exception as e:
         logger.warning(f"Receive white users error: {e}", exc_info=True)
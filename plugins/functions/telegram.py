@@ -17,7 +17,11 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
-from typing import Generator, Iterable, List, Optional, Union
+from collections import OrderedDict
+from os.path import exists
+from pickle import load
+from threading import Event
+from typing import Any, Callable, Dict, Generator, Iterable, List, Optional, Union
 
 from pyrogram import Chat, ChatMember, ChatPermissions, ChatPreview, Client, InlineKeyboardMarkup, Message
 from pyrogram.api.functions.users import GetFullUser
@@ -27,7 +31,7 @@ from pyrogram.errors import MessageDeleteForbidden, PeerIdInvalid
 from pyrogram.errors import UsernameInvalid, UsernameNotOccupied, UserNotParticipant
 
 from .. import glovar
-from .etc import delay, get_int, t2t, wait_flood
+from .etc import delay, get_int, get_now, t2t, wait_flood
 
 # Enable logging
 logger = logging.getLogger(__name__)
@@ -106,7 +110,7 @@ def get_chat(client: Client, cid: Union[int, str]) -> Union[Chat, ChatPreview, N
         while flood_wait:
             flood_wait = False
             try:
-                result = client.get_chat(chat_id=cid)
+                result = single_flight(f"chat_{cid}", client.get_chat, {"chat_id": cid})
             except FloodWait as e:
                 flood_wait = True
                 wait_flood(e)
@@ -127,7 +131,7 @@ def get_chat_member(client: Client, cid: int, uid: int) -> Union[bool, ChatMembe
         while flood_wait:
             flood_wait = False
             try:
-                result = client.get_chat_member(chat_id=cid, user_id=uid)
+                result = single_flight(f"member_{cid}_{uid}", client.get_chat_member, {"chat_id": cid, "user_id": uid})
             except FloodWait as e:
                 flood_wait = True
                 wait_flood(e)
@@ -163,7 +167,7 @@ def get_group_info(client: Client, chat: Union[int, Chat], cache: bool = True) -
     group_link = glovar.default_group_link
     try:
         if isinstance(chat, int):
-            the_cache = glovar.chats.get(chat)
+            the_cache = glovar.chats.get(chat, {}).get("chat")
 
             if the_cache:
                 chat = the_cache
@@ -171,7 +175,7 @@ def get_group_info(client: Client, chat: Union[int, Chat], cache: bool = True) -
                 result = get_chat(client, chat)
 
                 if cache and result:
-                    glovar.chats[chat] = result
+                    glovar.chats[chat] = {"chat": result, "until": get_now() + glovar.time_chat}
 
                 chat = result
 
@@ -227,7 +231,7 @@ def get_messages(client: Client, cid: int, mids: Union[int, Iterable[int]]) -> U
 
 
 def get_user_bio(client: Client, uid: int, normal: bool = False, printable: bool = False) -> Optional[str]:
-    # Get user's bio
+    # Get user's bio, return "" if the user has no bio, or None on errors
     result = None
     try:
         user_id = resolve_peer(client, uid)
@@ -239,10 +243,10 @@ def get_user_bio(client: Client, uid: int, normal: bool = False, printable: bool
         while flood_wait:
             flood_wait = False
             try:
-                user: UserFull = client.send(GetFullUser(id=user_id))
+                user: UserFull = single_flight(f"bio_{uid}", client.send, {"data": GetFullUser(id=user_id)})
 
-                if user and user.about:
-                    result = t2t(user.about, normal, printable)
+                if user:
+                    result = t2t(user.about, normal, printable) if user.about else ""
             except FloodWait as e:
                 flood_wait = True
                 wait_flood(e)
@@ -252,6 +256,63 @@ def get_user_bio(client: Client, uid: int, normal: bool = False, printable: bool
     return result
 
 
+def get_user_bios(client: Client, uids: Iterable[int]) -> Dict[int, str]:
+    # Get users' bios from the cache, fetch the missing ones concurrently
+    result = {}
+    try:
+        now = get_now()
+        futures = {}
+
+        for uid in uids:
+            the_cache = glovar.bios.get(uid)
+
+            if the_cache and the_cache[1] > now:
+                result[uid] = the_cache[0]
+            else:
+                futures[uid] = glovar.executor.submit(get_user_bio, client, uid, True, True)
+
+        for uid in futures:
+            bio = futures[uid].result()
+            result[uid] = bio or ""
+
+            # Do not cache errors
+            if bio is None:
+                continue
+
+            with glovar.locks["bio"]:
+                glovar.bios.pop(uid, None)
+                glovar.bios[uid] = (result[uid], now + glovar.time_bio)
+
+                while len(glovar.bios) > glovar.bios_size:
+                    glovar.bios.popitem(last=False)
+    except Exception as e:
+        logger.warning(f"Get user bios error: {e}", exc_info=True)
+
+    return result
+
+
+def get_usernames() -> OrderedDict:
+    # Get the username cache, load it from the file at the first time
+    result = OrderedDict()
+    try:
+        if glovar.usernames is not None:
+            return glovar.usernames
+
+        with glovar.locks["username"]:
+            if glovar.usernames is None and exists("data/usernames"):
+                with open("data/usernames", "rb") as f:
+                    glovar.usernames = load(f)
+
+            if not isinstance(glovar.usernames, OrderedDict):
+                glovar.usernames = OrderedDict()
+
+        result = glovar.usernames
+    except Exception as e:
+        logger.warning(f"Get usernames error: {e}", exc_info=True)
+
+    return result
+
+
 def kick_chat_member(client: Client, cid: int, uid: Union[int, str]) -> Union[bool, Message, None]:
     # Kick a chat member in a group
     result = None
@@ -299,7 +360,7 @@ def resolve_peer(client: Client, pid: Union[int, str]) -> Union[bool, InputPeerC
         while flood_wait:
             flood_wait = False
             try:
-                result = client.resolve_peer(pid)
+                result = single_flight(f"peer_{pid}", client.resolve_peer, {"peer_id": pid})
             except FloodWait as e:
                 flood_wait = True
                 wait_flood(e)
@@ -321,13 +382,18 @@ def resolve_username(client: Client, username: str, cache: bool = True) -> (str,
         if not username:
             return "", 0
 
-        result = glovar.usernames.get(username)
+        now = get_now()
+        usernames = get_usernames()
+        result = usernames.get(username)
 
-        if result and cache:
+        if result and cache and result["until"] > now:
             return result["peer_type"], result["peer_id"]
 
         result = resolve_peer(client, username)
 
+        if result is None:
+            return "", 0
+
         if result:
             if isinstance(result, InputPeerChannel):
                 peer_type = "channel"
@@ -337,10 +403,16 @@ def resolve_username(client: Client, username: str, cache: bool = True) -> (str,
                 peer_type = "user"
                 peer_id = result.user_id
 
-        glovar.usernames[username] = {
-            "peer_type": peer_type,
-            "peer_id": peer_id
-        }
+        with glovar.locks["username"]:
+            usernames.pop(username, {})
+            usernames[username] = {
+                "peer_type": peer_type,
+                "peer_id": peer_id,
+                "until": now + (glovar.time_username if peer_type else glovar.time_username_invalid)
+            }
+
+            while len(usernames) > glovar.usernames_size:
+                usernames.popitem(last=False)
     except Exception as e:
         logger.warning(f"Resolve username {username} error: {e}", exc_info=True)
 
@@ -473,6 +545,41 @@ def send_report_message(secs: int, client: Client, cid: int, text: str, mid: int
     return result
 
 
+def single_flight(key: str, func: Callable, kwargs: Dict[str, Any]) -> Any:
+    # Run the function once for concurrent callers with the same key, share the result or the exception
+    with glovar.locks["flight"]:
+        flight = glovar.flights.get(key)
+        leader = flight is None
+
+        if leader:
+            flight = glovar.flights[key] = {
+                "event": Event(),
+                "error": None,
+                "result": None
+            }
+
+    if not leader:
+        flight["event"].wait()
+
+        if flight["error"]:
+            raise flight["error"]
+
+        return flight["result"]
+
+    try:
+        flight["result"] = func(**kwargs)
+    except Exception as e:
+        flight["error"] = e
+        raise e
+    finally:
+        with glovar.locks["flight"]:
+            glovar.flights.pop(key, None)
+
+        flight["event"].set()
+
+    return flight["result"]
+
+
 def unban_chat_member(client: Client, cid: int, uid: Union[int, str]) -> Optional[bool]:
     # Unban a user in a group
     result = None
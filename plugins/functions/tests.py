@@ -25,8 +25,9 @@ from pyrogram import Client, Message
 from .. import glovar
 from .channel import get_content
 from .etc import code, get_int, get_md5sum, get_text, lang, mention_id, thread
-from .file import delete_file, get_downloaded_path
+from .file import get_downloaded_data
 from .filters import is_bmd, is_class_e, is_detected_url, is_emoji, is_exe, is_regex_text, is_tgl
+from .ids import get_detected_content, has_except_temp
 from .image import get_file_id, get_qrcode
 from .telegram import send_message
 
@@ -49,7 +50,7 @@ def clean_test(client: Client, message: Message) -> bool:
 
         # Detected record
         content = get_content(message)
-        detection = glovar.contents.get(content, "")
+        detection = get_detected_content(content)
 
         if detection:
             text += f"{lang('record_content')}{lang('colon')}{code(lang(detection))}\n"
@@ -99,10 +100,9 @@ def clean_test(client: Client, message: Message) -> bool:
 
         # QR code
         file_id, file_ref, big = get_file_id(message)
-        image_path = big and get_downloaded_path(client, file_id, file_ref)
-        image_hash = image_path and get_md5sum("file", image_path)
-        qrcode = image_path and get_qrcode(image_path)
-        image_path and thread(delete_file, (image_path,))
+        image_data = big and get_downloaded_data(client, file_id, file_ref)
+        image_hash = image_data and get_md5sum("bytes", image_data)
+        qrcode = image_data and get_qrcode(image_data)
 
         if qrcode:
             text += f"{lang('qrc')}{lang('colon')}{code('True')}\n"
@@ -128,7 +128,7 @@ def clean_test(client: Client, message: Message) -> bool:
 
         # Send the result
         if text:
-            whitelisted = is_class_e(None, message) or image_hash in glovar.except_ids["temp"]
+            whitelisted = is_class_e(None, message) or has_except_temp(image_hash)
             text = f"{lang('white_listed')}{lang('colon')}{code(whitelisted)}\n" + text
             text = f"{lang('admin')}{lang('colon')}{mention_id(aid)}\n\n" + text
             thread(send_message, (client, glovar.test_group_id, text, message.message_id))
@@ -17,19 +17,23 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
-from copy import deepcopy
+from array import array
+from os.path import exists
 from time import sleep
 
 from pyrogram import Client
 from pyrogram.errors import FloodWait
 
 from .. import glovar
-from .channel import get_debug_text, share_data, share_regex_count
-from .etc import code, general_link, get_now, lang, thread, wait_flood
-from .file import save
-from .filters import is_in_config
-from .group import leave_group
-from .telegram import delete_messages, get_admins, get_chat_members_count, get_group_info, get_members, send_message
+from .channel import get_debug_text, share_data, share_data_thread, share_regex_count
+from .etc import code, general_link, get_md5sum, get_now, lang, thread, wait_flood
+from .file import data_to_file, save, save_thread
+from .filters import is_bad_bio, is_in_config
+from .group import leave_group, update_group
+from .ids import discard_user_times, get_watch_data, pop_sticker_ids, prune_ttl_ids, prune_user_data, reset_except_temp
+from .ids import reset_user_scores, set_trust_ids
+from .telegram import delete_messages, get_admins, get_chat_members_count, get_group_info, get_members, get_user_bios
+from .telegram import send_message
 from .user import kick_user, unban_user
 
 # Enable logging
@@ -37,15 +41,35 @@ logger = logging.getLogger(__name__)
 
 
 def backup_files(client: Client) -> bool:
-    # Backup data files to BACKUP
+    # Backup changed data files to BACKUP, in one archive if BACKUP accepts it
     try:
+        archive = {}
+        file_hashes = {}
+
         for file in glovar.file_list:
             # Check
             if not eval(f"glovar.{file}"):
                 continue
 
-            # Share
-            share_data(
+            if not exists(f"data/{file}"):
+                continue
+
+            with open(f"data/{file}", "rb") as f:
+                file_data = f.read()
+
+            # Skip unchanged file
+            file_hash = get_md5sum("bytes", file_data)
+
+            if not file_hash or glovar.file_hashes.get(file) == file_hash:
+                continue
+
+            if glovar.archive:
+                archive[file] = file_data
+                file_hashes[file] = file_hash
+                continue
+
+            # Share the file alone
+            result = share_data_thread(
                 client=client,
                 receivers=["BACKUP"],
                 action="backup",
@@ -53,8 +77,29 @@ def backup_files(client: Client) -> bool:
                 data=file,
                 file=f"data/{file}"
             )
+
+            if result:
+                glovar.file_hashes[file] = file_hash
+
             sleep(5)
 
+        if not archive:
+            return True
+
+        # Share the archive
+        file = data_to_file({glovar.archive_key: archive})
+        result = share_data_thread(
+            client=client,
+            receivers=["BACKUP"],
+            action="backup",
+            action_type="archive",
+            data=list(archive),
+            file=file
+        )
+
+        if result:
+            glovar.file_hashes.update(file_hashes)
+
         return True
     except Exception as e:
         logger.warning(f"Backup error: {e}", exc_info=True)
@@ -175,59 +220,105 @@ def interval_hour_01(client: Client) -> bool:
             if now - time > 3600:
                 glovar.message_ids[gid]["purge"] = (0, 0)
 
-        # Delete stickers and animations in groups
-        with glovar.locks["message"]:
-            message_ids = deepcopy(glovar.message_ids)
+        save("message_ids")
+    except Exception as e:
+        logger.warning(f"Interval hour 01 error: {e}", exc_info=True)
+
+    return False
 
-        for gid in list(glovar.configs):
-            mid_dict = deepcopy(message_ids[gid]["stickers"])
-            mid_list = list(filter(lambda m: now - mid_dict[m] >= glovar.time_sticker, mid_dict))
+
+def interval_min_01(client: Client) -> bool:
+    # Execute every minute
+    try:
+        # Basic data
+        now = get_now()
+
+        # Delete stickers and animations in groups
+        for gid in list(glovar.sticker_ids):
+            mid_list = pop_sticker_ids(gid, now - glovar.time_sticker)
 
             if not mid_list:
                 continue
 
-            for mid in mid_list:
-                glovar.message_ids[gid]["stickers"].pop(mid, 0)
+            if not is_in_config(gid, "ttd"):
+                continue
 
-            if is_in_config(gid, "ttd"):
-                thread(delete_messages, (client, gid, mid_list))
-                count_text = f"{len(mid_list)} {lang('messages')}"
-                text = get_debug_text(client, gid)
-                text += (f"{lang('action')}{lang('colon')}{code(lang('schedule_delete'))}\n"
-                         f"{lang('rule')}{lang('colon')}{code(lang('rule_custom'))}\n"
-                         f"{lang('sticker')}{lang('colon')}{code(count_text)}\n")
-                thread(send_message, (client, glovar.debug_channel_id, text))
+            thread(delete_messages, (client, gid, mid_list))
+            count_text = f"{len(mid_list)} {lang('messages')}"
+            text = get_debug_text(client, gid)
+            text += (f"{lang('action')}{lang('colon')}{code(lang('schedule_delete'))}\n"
+                     f"{lang('rule')}{lang('colon')}{code(lang('rule_custom'))}\n"
+                     f"{lang('sticker')}{lang('colon')}{code(count_text)}\n")
+            thread(send_message, (client, glovar.debug_channel_id, text))
+
+        # Save the scheduled stickers
+        if glovar.sticker_changed:
+            with glovar.locks["ids"]:
+                glovar.sticker_changed = False
+                save_thread("sticker_ids")
+
+        # Save the detected contents
+        if glovar.contents_changed:
+            with glovar.locks["content"]:
+                glovar.contents_changed = False
+                save_thread("contents")
+
+        # Commit the temp except list
+        if glovar.except_changed:
+            with glovar.locks["except"]:
+                glovar.except_changed = False
+                glovar.except_db.commit()
+
+        # Check the bios of the users joined during raids in one batch
+        with glovar.locks["message"]:
+            raid_bios, glovar.raid_bios = glovar.raid_bios, {}
 
-        save("message_ids")
+        bios = get_user_bios(client, {uid for gid in raid_bios for uid in raid_bios[gid]})
+
+        for gid in raid_bios:
+            uids = {uid for uid in raid_bios[gid] if is_bad_bio(bios.get(uid, ""))}
+            uids and discard_user_times("join", uids, gid) and glovar.raid_ids.add(gid)
+
+        # Save the users joined during raids
+        if glovar.raid_ids:
+            glovar.raid_ids = set()
+            save("user_ids")
+
+        return True
     except Exception as e:
-        logger.warning(f"Interval hour 01 error: {e}", exc_info=True)
+        logger.warning(f"Interval min 01 error: {e}", exc_info=True)
 
     return False
 
 
 def interval_min_10() -> bool:
     # Execute every 10 minutes
-    glovar.locks["message"].acquire()
     try:
-        # Clear used /clean group list
-        glovar.cleaned_ids = set()
+        # Basic data
+        now = get_now()
 
-        # Clear used /dafm user lists
-        for gid in list(glovar.deleted_ids):
-            glovar.deleted_ids[gid] = set()
+        # Remove expired /clean and /purge records
+        prune_ttl_ids(glovar.cleaned_ids, now)
+        prune_ttl_ids(glovar.purged_ids, now)
 
-        # Clear used /purge group list
-        glovar.purged_ids = set()
+        # Remove expired /dafm records and recorded users
+        for gid in list(glovar.deleted_ids):
+            prune_ttl_ids(glovar.deleted_ids.get(gid, {}), now)
 
-        # Clear recorded users
         for gid in list(glovar.recorded_ids):
-            glovar.recorded_ids[gid] = set()
+            prune_ttl_ids(glovar.recorded_ids.get(gid, {}), now)
+
+        # Remove expired user status
+        prune_user_data(now) and save("user_ids")
+
+        # Save resolved usernames
+        if glovar.usernames is not None:
+            with glovar.locks["username"]:
+                save_thread("usernames")
 
         return True
     except Exception as e:
         logger.warning(f"Interval min 10 error: {e}", exc_info=True)
-    finally:
-        glovar.locks["message"].release()
 
     return False
 
@@ -236,18 +327,18 @@ def reset_data(client: Client) -> bool:
     # Reset user data every month
     glovar.locks["message"].acquire()
     try:
-        glovar.bad_ids["users"] = set()
+        glovar.bad_ids["users"] = array("q")
         save("bad_ids")
 
-        glovar.except_ids["temp"] = set()
+        reset_except_temp()
         save("except_ids")
 
-        glovar.user_ids = {}
+        reset_user_scores()
         save("user_ids")
 
         glovar.watch_ids = {
-            "ban": {},
-            "delete": {}
+            "ban": get_watch_data({}),
+            "delete": get_watch_data({})
         }
         save("watch_ids")
 
@@ -309,11 +400,14 @@ def update_admins(client: Client) -> bool:
                 save("admin_ids")
 
                 # Trust list
-                glovar.trust_ids[gid] = {admin.user.id for admin in admin_members
-                                         if ((not admin.user.is_bot and not admin.user.is_deleted)
-                                             or admin.user.id in glovar.bot_ids)}
+                set_trust_ids(gid, {admin.user.id for admin in admin_members
+                                    if ((not admin.user.is_bot and not admin.user.is_deleted)
+                                        or admin.user.id in glovar.bot_ids)})
                 save("trust_ids")
 
+                # Group cache
+                update_group(client, gid)
+
                 if glovar.user_id not in glovar.admin_ids[gid]:
                     reason = "user"
                 else:
@@ -24,13 +24,14 @@ from pyrogram import ChatPermissions, Client, Message
 
 from .. import glovar
 from .etc import crypt_str, get_forward_name, get_full_name, get_now, lang, thread
-from .channel import ask_for_help, declare_message, forward_evidence, send_debug, share_bad_user
+from .channel import ask_for_help, declare_message, forward_evidence, get_content, send_debug, share_bad_user
 from .channel import share_watch_user, update_score
 from .file import save
 from .group import delete_message
 from .filters import is_class_d, is_class_e_user, is_declared_message, is_detected_user, is_high_score_user
-from .filters import is_limited_user, is_new_user, is_watch_user, is_wb_text
-from .ids import init_user_id
+from .filters import is_limited_user, is_new_user, is_qrc, is_watch_user, is_wb_text
+from .ids import add_detected_content, add_except_temp, add_id, add_ttl_id, add_user_times, has_id, has_ttl_id
+from .ids import set_watch_until
 from .telegram import kick_chat_member, restrict_chat_member, unban_chat_member
 
 # Enable logging
@@ -40,10 +41,10 @@ logger = logging.getLogger(__name__)
 def add_bad_user(client: Client, uid: int) -> bool:
     # Add a bad user, share it
     try:
-        if uid in glovar.bad_ids["users"]:
+        if has_id(glovar.bad_ids["users"], uid):
             return True
 
-        glovar.bad_ids["users"].add(uid)
+        add_id(glovar.bad_ids["users"], uid)
         save("bad_ids")
         share_bad_user(client, uid)
 
@@ -57,11 +58,8 @@ def add_bad_user(client: Client, uid: int) -> bool:
 def add_detected_user(gid: int, uid: int, now: int) -> bool:
     # Add or update a detected user's status
     try:
-        if not init_user_id(uid):
-            return False
-
-        previous = glovar.user_ids[uid]["detected"].get(gid)
-        glovar.user_ids[uid]["detected"][gid] = now
+        previous = glovar.user_ids["detected"].get(uid, {}).get(gid)
+        add_user_times("detected", [uid], gid, now)
 
         return bool(previous)
     except Exception as e:
@@ -74,7 +72,7 @@ def add_watch_user(client: Client, the_type: str, uid: int, now: int) -> bool:
     # Add a watch ban user, share it
     try:
         until = now + glovar.time_ban
-        glovar.watch_ids[the_type][uid] = until
+        set_watch_until(the_type, uid, until)
         until = str(until)
         until = crypt_str("encrypt", until, glovar.key)
         share_watch_user(client, the_type, uid, until)
@@ -102,6 +100,30 @@ def ban_user(client: Client, gid: int, uid: Union[int, str]) -> bool:
     return False
 
 
+def check_media(client: Client, message: Message) -> bool:
+    # Check the message's media in the media pool
+    result = False
+
+    try:
+        # Download and decode outside the lock
+        detection = is_qrc(client, message) and "qrc"
+
+        with glovar.locks["message"]:
+            content = get_content(message)
+
+            if detection:
+                result = terminate_user(client, message, detection)
+                result and content and add_detected_content(content, detection)
+            elif message.sticker and content:
+                add_except_temp(content)
+    except Exception as e:
+        logger.warning(f"Check media error: {e}", exc_info=True)
+    finally:
+        glovar.media_slots.release()
+
+    return result
+
+
 def kick_user(client: Client, gid: int, uid: Union[int, str]) -> bool:
     # Kick a user
     try:
@@ -149,7 +171,7 @@ def terminate_user(client: Client, message: Message, the_type: str) -> bool:
             if ((is_wb_text(full_name, False) or is_wb_text(forward_name, False))
                     and (full_name not in glovar.except_ids["long"] and forward_name not in glovar.except_ids["long"])
                     and not is_class_e_user(message.from_user)
-                    and uid not in glovar.white_ids):
+                    and not has_id(glovar.white_ids, uid)):
                 result = forward_evidence(
                     client=client,
                     message=message,
@@ -172,7 +194,7 @@ def terminate_user(client: Client, message: Message, the_type: str) -> bool:
                         mid=mid,
                         em=result
                     )
-            elif is_watch_user(message.from_user, "ban", now) and uid not in glovar.white_ids:
+            elif is_watch_user(message.from_user, "ban", now) and not has_id(glovar.white_ids, uid):
                 result = forward_evidence(
                     client=client,
                     message=message,
@@ -221,7 +243,7 @@ def terminate_user(client: Client, message: Message, the_type: str) -> bool:
                         em=result
                     )
             elif (is_watch_user(message.from_user, "delete", now)
-                  and uid not in glovar.white_ids
+                  and not has_id(glovar.white_ids, uid)
                   and the_type in {"aff", "exe", "iml", "pho", "tgp", "qrc"}):
                 result = forward_evidence(
                     client=client,
@@ -249,7 +271,7 @@ def terminate_user(client: Client, message: Message, the_type: str) -> bool:
             elif (((is_new_user(message.from_user, now, 0, True) and the_type in {"exe", "qrc"})
                    or (is_new_user(message.from_user, now, gid) and the_type in {"aff", "sho", "tgp"})
                    or (is_limited_user(gid, message.from_user, now) and the_type in {"iml", "pho", "tgl"}))
-                  and uid not in glovar.white_ids):
+                  and not has_id(glovar.white_ids, uid)):
                 result = forward_evidence(
                     client=client,
                     message=message,
@@ -273,7 +295,7 @@ def terminate_user(client: Client, message: Message, the_type: str) -> bool:
                         mid=mid,
                         em=result
                     )
-            elif is_detected_user(message) or uid in glovar.recorded_ids[gid] or the_type == "true":
+            elif is_detected_user(message) or has_ttl_id(glovar.recorded_ids[gid], uid, now) or the_type == "true":
                 delete_message(client, gid, mid)
                 add_detected_user(gid, uid, now)
                 declare_message(client, gid, mid)
@@ -288,7 +310,7 @@ def terminate_user(client: Client, message: Message, the_type: str) -> bool:
                 )
 
                 if result:
-                    glovar.recorded_ids[gid].add(uid)
+                    add_ttl_id(glovar.recorded_ids[gid], uid, now)
                     delete_message(client, gid, mid)
                     declare_message(client, gid, mid)
                     previous = add_detected_user(gid, uid, now)
@@ -302,7 +324,7 @@ def terminate_user(client: Client, message: Message, the_type: str) -> bool:
                         em=result
                     )
         else:
-            if uid in glovar.recorded_ids[gid]:
+            if has_ttl_id(glovar.recorded_ids[gid], uid, now):
                 delete_message(client, gid, mid)
                 declare_message(client, gid, mid)
             else:
@@ -316,7 +338,7 @@ def terminate_user(client: Client, message: Message, the_type: str) -> bool:
                 )
 
                 if result:
-                    glovar.recorded_ids[gid].add(uid)
+                    add_ttl_id(glovar.recorded_ids[gid], uid, now)
                     delete_message(client, gid, mid)
                     declare_message(client, gid, mid)
                     the_type = (lambda x: x if x in glovar.types["basic"] else None)(the_type)
@@ -18,17 +18,25 @@
 
 import logging
 import pickle
+import re
+from array import array
 from codecs import getdecoder
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from configparser import RawConfigParser
+from hashlib import blake2b
+from multiprocessing import get_context
+from multiprocessing.context import BaseContext
 from os import mkdir
 from os.path import exists
 from shutil import rmtree
+from sqlite3 import Connection, connect
 from string import ascii_lowercase
-from threading import Lock
-from typing import Dict, List, Set, Tuple, Union
+from threading import BoundedSemaphore, Event, Lock
+from typing import Dict, List, Optional, Set, Tuple, Union
 
 from emoji import UNICODE_EMOJI
-from pyrogram import Chat, ChatMember
+from pyrogram import Chat
 
 # Enable logging
 logging.basicConfig(
@@ -70,6 +78,7 @@ test_group_id: int = 0
 
 # [custom]
 aio: Union[bool, str] = ""
+archive: Union[bool, str] = "False"
 backup: Union[bool, str] = ""
 date_reset: str = ""
 default_group_link: str = ""
@@ -85,6 +94,7 @@ time_short: int = 0
 time_sticker: int = 0
 time_track: int = 0
 zh_cn: Union[bool, str] = ""
+zip_receivers: Union[str, Set[str]] = ""
 
 # [emoji]
 emoji_ad_single: int = 0
@@ -131,6 +141,8 @@ try:
     # [custom]
     aio = config["custom"].get("aio", aio)
     aio = eval(aio)
+    archive = config["custom"].get("archive", archive)
+    archive = eval(archive)
     backup = config["custom"].get("backup", backup)
     backup = eval(backup)
     date_reset = config["custom"].get("date_reset", date_reset)
@@ -150,6 +162,8 @@ try:
     time_track = int(config["custom"].get("time_track", str(time_track)))
     zh_cn = config["custom"].get("zh_cn", zh_cn)
     zh_cn = eval(zh_cn)
+    zip_receivers = config["custom"].get("zip_receivers", zip_receivers)
+    zip_receivers = set(zip_receivers.split())
 
     # [emoji]
     emoji_ad_single = int(config.get("emoji", "emoji_ad_single", fallback=emoji_ad_single))
@@ -188,6 +202,7 @@ if (bot_token in {"", "[DATA EXPUNGED]"}
         or logging_channel_id == 0
         or test_group_id == 0
         or aio not in {False, True}
+        or archive not in {False, True}
         or backup not in {False, True}
         or date_reset in {"", "[DATA EXPUNGED]"}
         or default_group_link in {"", "[DATA EXPUNGED]"}
@@ -391,30 +406,62 @@ all_commands: List[str] = [
     "version"
 ]
 
+bio_verdicts: Dict[bytes, Tuple[int, bool]] = OrderedDict()
+# bio_verdicts = {
+#     b"bio": (0, True)
+# }
+
+bios: Dict[int, Tuple[str, int]] = OrderedDict()
+# bios = {
+#     12345678: ("bio", 1512345678)
+# }
+
+bios_size: int = 10000
+
+bloom_hashes: int = 4
+
+bloom_size: int = 2 * 1024 * 1024
+
 bot_ids: Set[int] = {avatar_id, captcha_id, clean_id, lang_id, long_id, noflood_id,
                      noporn_id, nospam_id, tip_id, user_id, warn_id}
 
-chats: Dict[int, Chat] = {}
+chats: Dict[int, Dict[str, Union[Chat, dict, int, None]]] = {}
 # chats = {
-#     -10012345678: Chat
+#     -10012345678: {
+#         "chat": Chat,
+#         "until": 1512345678,
+#         "bypass": {
+#             "description": "description",
+#             "links": {"t.me/scp_079"},
+#             "pinned_content": b"content",
+#             "pinned_text": "pinned text",
+#             "sticker": "sticker set name",
+#             "usernames": {"scp_079"}
+#         }
+#     }
 # }
 
-cleaned_ids: Set[int] = set()
-# cleaned_ids = {-10012345678}
-
-contents: Dict[str, str] = {}
-# contents = {
-#     "content": "tgl"
+cleaned_ids: Dict[int, int] = {}
+# cleaned_ids = {
+#     -10012345678: 1512345678
 # }
 
-declared_message_ids: Dict[int, Set[int]] = {}
+contents_changed: bool = False
+
+contents_size: int = 100000
+
+declared_message_ids: Dict[int, Tuple[int, int]] = {}
 # declared_message_ids = {
-#     -10012345678: {123}
+#     -10012345678: (123, 0b101)
 # }
 
-deleted_ids: Dict[int, Set[int]] = {}
+declared_size: int = 10000
+
+deleted_ids: Dict[int, Dict[int, int]] = {}
 # deleted_ids = {
-#     -10012345678: {12345678}
+#     -10012345678: {
+#         12345678: 1512345678
+#     }
 # }
 
 default_config: Dict[str, Union[bool, int]] = {
@@ -454,47 +501,81 @@ default_config: Dict[str, Union[bool, int]] = {
     "dic": False
 }
 
-default_message_data: Dict[str, Union[int, Dict[int, int], Tuple[int, int]]] = {
+default_message_data: Dict[str, Union[int, Tuple[int, int]]] = {
     "purge": (0, 0),
-    "service": 0,
-    "stickers": {}
-}
-
-default_user_status: Dict[str, Dict[Union[int, str], Union[float, int]]] = {
-    "detected": {},
-    "join": {},
-    "score": {
-        "captcha": 0.0,
-        "clean": 0.0,
-        "lang": 0.0,
-        "long": 0.0,
-        "noflood": 0.0,
-        "noporn": 0.0,
-        "nospam": 0.0,
-        "recheck": 0.0,
-        "warn": 0.0
-    }
+    "service": 0
 }
 
 emoji_set: Set[str] = set(UNICODE_EMOJI)
 
+except_bloom: bytearray = bytearray(bloom_size)
+
+except_changed: bool = False
+
+executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=8)
+
+file_hashes: Dict[str, str] = {}
+# file_hashes = {
+#     "user_ids": "0123456789abcdef0123456789abcdef"
+# }
+
+flights: Dict[str, Dict[str, Union[Event, Exception, object, None]]] = {}
+# flights = {
+#     "chat_-10012345678": {
+#         "event": Event,
+#         "error": None,
+#         "result": Chat
+#     }
+# }
+
+join_rates: Dict[int, Tuple[int, int]] = {}
+# join_rates = {
+#     -10012345678: (1512345678, 12)
+# }
+
 locks: Dict[str, Lock] = {
     "admin": Lock(),
+    "bio": Lock(),
     "config": Lock(),
+    "content": Lock(),
+    "except": Lock(),
+    "flight": Lock(),
+    "ids": Lock(),
+    "member": Lock(),
     "message": Lock(),
+    "name": Lock(),
+    "qrcode": Lock(),
     "receive": Lock(),
     "regex": Lock(),
     "test": Lock(),
-    "text": Lock()
+    "text": Lock(),
+    "username": Lock()
 }
 
-members: Dict[int, Dict[int, ChatMember]] = {}
+members: Dict[int, Dict[int, Tuple[str, int]]] = {}
 # members = {
-#     -10012345678: {
-#         12345678: ChatMember
-#     }
+#     -10012345678: OrderedDict({
+#         12345678: ("member", 1512345678)
+#     })
+# }
+
+members_size: int = 1000
+
+media_executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=4)
+
+media_size: int = 32
+
+media_slots: BoundedSemaphore = BoundedSemaphore(media_size)
+
+memory_size: int = 16 * 1024 * 1024
+
+name_verdicts: Dict[Tuple[str, int], Tuple[bytes, int, bool]] = OrderedDict()
+# name_verdicts = {
+#     ("user", 12345678): (b"name", 0, False)
 # }
 
+names_size: int = 10000
+
 other_commands: Set[str] = {
     "admin",
     "admins",
@@ -553,8 +634,34 @@ other_commands: Set[str] = {
     "white"
 }
 
-purged_ids: Set[int] = set()
-# purged_ids = {-10012345678}
+qrcode_pixels: int = 25000000
+
+qrcode_size: int = 1280
+
+qrcode_table: List[int] = [0 if i < 150 else 255 for i in range(256)]
+
+qrcode_workers: int = 2
+
+# Fork the decoding processes from a clean server process, it only preloads the decoding module
+qrcode_context: BaseContext = get_context("forkserver")
+qrcode_context.set_forkserver_preload(["plugins.functions.qrcode"])
+
+qrcode_executor: ProcessPoolExecutor = ProcessPoolExecutor(max_workers=qrcode_workers, mp_context=qrcode_context)
+
+raid_bios: Dict[int, Set[int]] = {}
+# raid_bios = {
+#     -10012345678: {12345678}
+# }
+
+raid_ids: Set[int] = set()
+# raid_ids = {-10012345678}
+
+raid_limit: int = 30
+
+purged_ids: Dict[int, int] = {}
+# purged_ids = {
+#     -10012345678: 1512345678
+# }
 
 receivers: Dict[str, List[str]] = {
     "bad": ["ANALYZE", "APPLY", "AVATAR", "CAPTCHA", "CLEAN", "LANG", "LONG", "MANAGE",
@@ -567,11 +674,15 @@ receivers: Dict[str, List[str]] = {
               "NOFLOOD", "NOPORN", "NOSPAM", "RECHECK", "TIP", "USER", "WARN", "WATCH"]
 }
 
-recorded_ids: Dict[int, Set[int]] = {}
+recorded_ids: Dict[int, Dict[int, int]] = {}
 # recorded_ids = {
-#     -10012345678: {12345678}
+#     -10012345678: {
+#         12345678: 1512345678
+#     }
 # }
 
+regex_generation: int = 0
+
 regex: Dict[str, bool] = {
     "ad": False,
     "ban": False,
@@ -596,10 +707,41 @@ for c in ascii_lowercase:
 
 regex["adi"] = True
 
+score_types: List[str] = ["captcha", "clean", "lang", "long", "noflood", "noporn", "nospam", "recheck", "warn"]
+
 sender: str = "CLEAN"
 
 should_hide: bool = False
 
+sticker_changed: bool = False
+
+time_bio: int = 3600
+
+time_bucket: int = 600
+
+time_chat: int = 3600
+
+time_left: int = 600
+
+time_member: int = 3600
+
+time_qrcode: int = 10
+
+time_raid: int = 60
+
+time_retry: int = 60
+
+time_username: int = 86400
+
+time_username_invalid: int = 3600
+
+time_cooldown: int = 600
+
+trusted_ids: Dict[int, int] = {}
+# trusted_ids = {
+#     12345678: 1
+# }
+
 types: Dict[str, Union[List[str], Set[str]]] = {
     "all": ["con", "loc", "vdn", "voi",
             "ast", "aud", "bmd", "doc", "gam", "gif", "via", "vid", "ser", "sti",
@@ -610,16 +752,32 @@ types: Dict[str, Union[List[str], Set[str]]] = {
     "spam": {"aff", "emo", "exe", "iml", "pho", "sho", "tgl", "tgp", "qrc", "true"}
 }
 
-usernames: Dict[str, Dict[str, Union[int, str]]] = {}
-# usernames = {
+user_buckets: Dict[str, Dict[int, Set[int]]] = {
+    "join": {}
+}
+# user_buckets = {
+#     "join": {
+#         2520576: {12345678}
+#     }
+# }
+
+usernames: Optional[Dict[str, Dict[str, Union[int, str]]]] = None
+# usernames = OrderedDict({
 #     "SCP_079": {
 #         "peer_type": "channel",
-#         "peer_id": -1001196128009
+#         "peer_id": -1001196128009,
+#         "until": 1512345678
 #     }
-# }
+# })
+
+usernames_size: int = 10000
 
 version: str = "0.3.0"
 
+zip_header: bytes = b"SCP-079-ZLIB"
+
+archive_key: str = "SCP-079-ARCHIVE"
+
 # Load data from pickle
 
 # Init dir
@@ -639,25 +797,26 @@ admin_ids: Dict[int, Set[int]] = {}
 #     -10012345678: {12345678}
 # }
 
-bad_ids: Dict[str, Set[int]] = {
+bad_ids: Dict[str, Union[array, Set[int]]] = {
     "channels": set(),
-    "users": set()
+    "users": array("q")
 }
 # bad_ids = {
 #     "channels": {-10012345678},
-#     "users": {12345678}
+#     "users": array("q", [12345678])
 # }
 
-except_ids: Dict[str, Set[Union[int, str]]] = {
+except_ids: Dict[str, Set[Union[bytes, int, str]]] = {
     "channels": set(),
     "long": set(),
     "temp": set()
 }
 # except_ids = {
 #     "channels": {-10012345678},
-#     "long": {"content"},
-#     "temp": {"content"}
+#     "long": {b"content", "name"},
+#     "temp": set()
 # }
+# The temp except list is kept in except_db, only old data has contents in "temp"
 
 flooded_ids: Set[int] = set()
 # flooded_ids = {-10012345678}
@@ -665,64 +824,81 @@ flooded_ids: Set[int] = set()
 left_group_ids: Set[int] = set()
 # left_group_ids = {-10012345678}
 
-message_ids: Dict[int, Dict[str, Union[int, Dict[int, int], Tuple[int, int]]]] = {}
+message_ids: Dict[int, Dict[str, Union[int, Tuple[int, int]]]] = {}
 # message_ids = {
 #     -10012345678: {
 #         "purge": (123, 1512345678)
-#         "service": 123,
-#         "stickers": {
-#             456: 1512345678,
-#             789: 1512346678
-#         }
+#         "service": 123
 #     }
 # }
 
+sticker_ids: Dict[int, deque] = {}
+# sticker_ids = {
+#     -10012345678: deque([(456, 1512345678), (789, 1512346678)])
+# }
+
 trust_ids: Dict[int, Set[int]] = {}
 # trust_ids = {
 #     -10012345678: {12345678}
 # }
 
-user_ids: Dict[int, Dict[str, Dict[Union[int, str], Union[float, int]]]] = {}
+user_ids: Dict[str, Union[array, Dict[int, Union[int, Dict[int, int]]]]] = {
+    "detected": {},
+    "join": {},
+    "rows": {},
+    "score": array("d"),
+    "total": array("d")
+}
 # user_ids = {
-#     12345678: {
-#         "detected": {
-#               -10012345678: 1512345678
-#         },
-#         "join": {
+#     "detected": {
+#         12345678: {
 #             -10012345678: 1512345678
-#         },
-#         "score": {
-#             "captcha": 0.0,
-#             "clean": 0.0,
-#             "lang": 0.0,
-#             "long": 0.0,
-#             "noflood": 0.0,
-#             "noporn": 0.0,
-#             "nospam": 0.0,
-#             "recheck": 0.0,
-#             "warn": 0.0
 #         }
-#     }
+#     },
+#     "join": {
+#         12345678: {
+#             -10012345678: 1512345678
+#         }
+#     },
+#     "rows": {
+#         12345678: 0
+#     },
+#     "score": array("d", [0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0]),
+#     "total": array("d", [0.0])
 # }
 
-watch_ids: Dict[str, Dict[int, int]] = {
-    "ban": {},
-    "delete": {}
+watch_ids: Dict[str, Dict[str, array]] = {
+    "ban": {
+        "ids": array("q"),
+        "until": array("q")
+    },
+    "delete": {
+        "ids": array("q"),
+        "until": array("q")
+    }
 }
 # watch_ids = {
 #     "ban": {
-#         12345678: 1512345678
+#         "ids": array("q", [12345678]),
+#         "until": array("q", [1512345678])
 #     },
 #     "delete": {
-#         12345678: 1512345678
+#         "ids": array("q", [12345678]),
+#         "until": array("q", [1512345678])
 #     }
 # }
 
-white_ids: Set[int] = set()
-# white_ids = {12345678}
+white_ids: array = array("q")
+# white_ids = array("q", [12345678])
 
 # Init data variables
 
+contents: Dict[Union[bytes, str], str] = OrderedDict()
+# contents = {
+#     b"content": "tgl",
+#     "url": "tgl"
+# }
+
 configs: Dict[int, Dict[str, Union[bool, int]]] = {}
 # configs = {
 #     -10012345678: {
@@ -772,8 +948,8 @@ for word_type in regex:
 
 # Load data
 file_list: List[str] = ["admin_ids", "bad_ids", "except_ids", "flooded_ids", "left_group_ids",
-                        "message_ids", "trust_ids", "user_ids", "watch_ids", "white_ids",
-                        "configs"]
+                        "message_ids", "sticker_ids", "trust_ids", "user_ids", "watch_ids", "white_ids",
+                        "configs", "contents"]
 file_list += [f"{f}_words" for f in regex]
 
 for file in file_list:
@@ -794,6 +970,101 @@ for file in file_list:
         logger.critical(f"Load data {file} backup error: {e}", exc_info=True)
         raise SystemExit("[DATA CORRUPTION]")
 
+# Convert old id lists to sorted id arrays
+if isinstance(bad_ids["users"], set):
+    bad_ids["users"] = array("q", sorted(bad_ids["users"]))
+
+for watch_type in ["ban", "delete"]:
+    if "ids" in watch_ids[watch_type]:
+        continue
+
+    watch_list = sorted(watch_ids[watch_type])
+    watch_ids[watch_type] = {
+        "ids": array("q", watch_list),
+        "until": array("q", [watch_ids[watch_type][uid] for uid in watch_list])
+    }
+
+if isinstance(white_ids, set):
+    white_ids = array("q", sorted(white_ids))
+
+# Move scheduled stickers out of the group messages
+for gid in [g for g in message_ids if "stickers" in message_ids[g]]:
+    sticker_dict = message_ids[gid].pop("stickers")
+    sticker_ids[gid] = deque(sorted(sticker_dict.items(), key=lambda x: (x[1], x[0])))
+
+# Convert old user status dicts to the columnar user data
+if "rows" not in user_ids:
+    user_status_list = user_ids
+    user_ids = {
+        "detected": {},
+        "join": {},
+        "rows": {},
+        "score": array("d"),
+        "total": array("d")
+    }
+
+    for uid in user_status_list:
+        user_scores = [float(user_status_list[uid]["score"].get(p, 0.0)) for p in score_types]
+        user_ids["rows"][uid] = len(user_ids["total"])
+        user_ids["score"].extend(user_scores)
+        user_ids["total"].append(sum(user_scores))
+
+        for user_key in ["detected", "join"]:
+            if user_status_list[uid][user_key]:
+                user_ids[user_key][uid] = user_status_list[uid][user_key]
+
+if (set(user_ids) != {"detected", "join", "rows", "score", "total"}
+        or len(user_ids["score"]) != len(user_ids["total"]) * len(score_types)):
+    logger.critical("Load data user_ids error: unknown structure")
+    raise SystemExit("[DATA CORRUPTION]")
+
+# Convert old content keys to fixed-size digests
+for content in [c for c in except_ids["long"] | except_ids["temp"] if isinstance(c, str)]:
+    content_key = blake2b(content.encode(), digest_size=16).digest()
+
+    if content in except_ids["long"]:
+        except_ids["long"].add(content_key)
+
+    if content in except_ids["temp"]:
+        except_ids["temp"].add(content_key)
+
+        if not re.search("^[0-9a-f]{32}$", content):
+            except_ids["temp"].discard(content)
+
+for content in [c for c in contents if isinstance(c, str) and "." not in c]:
+    contents[blake2b(content.encode(), digest_size=16).digest()] = contents.pop(content)
+
+# Move the temp except list to the on-disk exact set
+except_db: Connection = connect("data/except_temp", check_same_thread=False)
+except_db.execute("CREATE TABLE IF NOT EXISTS temp (content BLOB PRIMARY KEY)")
+
+if except_ids["temp"]:
+    except_db.executemany("INSERT OR IGNORE INTO temp VALUES (?)",
+                          [(c if isinstance(c, bytes) else c.encode(),) for c in except_ids["temp"]])
+    except_db.commit()
+    except_ids["temp"] = set()
+
+# Generate the bloom filter of the temp except list
+for (content,) in except_db.execute("SELECT content FROM temp"):
+    bloom_number = int.from_bytes(blake2b(content, digest_size=16).digest(), "big")
+
+    for i in range(bloom_hashes):
+        bloom_position = (bloom_number >> (i * 32)) & (bloom_size * 8 - 1)
+        except_bloom[bloom_position >> 3] |= 1 << (bloom_position & 7)
+
+# Generate trusted users' group count
+for uid in bot_ids:
+    trusted_ids[uid] = 1
+
+for gid in trust_ids:
+    for uid in trust_ids[gid]:
+        trusted_ids[uid] = trusted_ids.get(uid, 0) + 1
+
+# Generate user join time buckets
+for uid in user_ids["join"]:
+    for user_time in user_ids["join"][uid].values():
+        user_buckets["join"].setdefault(user_time // time_bucket, set()).add(uid)
+
 # Generate special characters dictionary
 for special in ["spc", "spe"]:
     locals()[f"{special}_dict"]: Dict[str, str] = {}
@@ -30,6 +30,7 @@ from ..functions.etc import get_readable_time, lang, mention_id, message_link, t
 from ..functions.file import save
 from ..functions.filters import authorized_group, from_user, is_class_c, test_group
 from ..functions.group import delete_message, get_config_text
+from ..functions.ids import add_ttl_id, has_ttl_id, pop_sticker_ids
 from ..functions.telegram import delete_messages, get_group_info, send_message, send_report_message
 
 # Enable logging
@@ -51,7 +52,7 @@ def clean(client: Client, message: Message) -> bool:
 
     try:
         # Check record
-        if gid in glovar.cleaned_ids:
+        if has_ttl_id(glovar.cleaned_ids, gid, get_now()):
             return True
 
         # Check permission
@@ -74,18 +75,11 @@ def clean(client: Client, message: Message) -> bool:
             return True
 
         # Clean
-        glovar.cleaned_ids.add(gid)
-
-        with glovar.locks["message"]:
-            mids = deepcopy(glovar.message_ids[gid]["stickers"])
-
+        now = get_now()
+        add_ttl_id(glovar.cleaned_ids, gid, now)
+        mids = pop_sticker_ids(gid, now)
         thread(delete_messages, (client, gid, mids))
 
-        for sticker_mid in mids:
-            glovar.message_ids[gid]["stickers"].pop(sticker_mid, 0)
-
-        save("message_ids")
-
         # Generate the report message's text
         text = (f"{lang('admin')}{lang('colon')}{code(aid)}\n"
                 f"{lang('action')}{lang('colon')}{code(lang('clean_action'))}\n"
@@ -306,7 +300,7 @@ def dafm(client: Client, message: Message) -> bool:
         # Check record
         uid = message.from_user.id
 
-        if uid in glovar.deleted_ids[gid]:
+        if has_ttl_id(glovar.deleted_ids[gid], uid, get_now()):
             return True
 
         # Check confirmation
@@ -329,7 +323,7 @@ def dafm(client: Client, message: Message) -> bool:
             return True
 
         # Delete
-        glovar.deleted_ids[gid].add(uid)
+        add_ttl_id(glovar.deleted_ids[gid], uid, get_now())
         ask_for_help(client, "delete", gid, uid)
 
         # Generate the report message's text
@@ -375,7 +369,7 @@ def purge(client: Client, message: Message) -> bool:
 
     try:
         # Check record
-        if gid in glovar.purged_ids:
+        if has_ttl_id(glovar.purged_ids, gid, get_now()):
             return True
 
         # Check permission
@@ -408,7 +402,7 @@ def purge(client: Client, message: Message) -> bool:
             return True
 
         # Purge
-        glovar.purged_ids.add(gid)
+        add_ttl_id(glovar.purged_ids, gid, get_now())
         thread(delete_messages, (client, gid, range(r_mid, mid)))
 
         # Generate the report message's text
@@ -458,7 +452,7 @@ def purge_begin(client: Client, message: Message) -> bool:
 
     try:
         # Check record
-        if gid in glovar.purged_ids:
+        if has_ttl_id(glovar.purged_ids, gid, get_now()):
             return True
 
         # Check permission
@@ -515,7 +509,7 @@ def purge_end(client: Client, message: Message) -> bool:
 
     try:
         # Check record
-        if gid in glovar.purged_ids:
+        if has_ttl_id(glovar.purged_ids, gid, get_now()):
             return True
 
         # Check permission
@@ -553,7 +547,7 @@ def purge_end(client: Client, message: Message) -> bool:
             return True
 
         # Purge
-        glovar.purged_ids.add(gid)
+        add_ttl_id(glovar.purged_ids, gid, get_now())
         thread(delete_messages, (client, gid, range(bid, eid + 1)))
         glovar.message_ids[gid]["purge"] = (0, 0)
         save("message_ids")
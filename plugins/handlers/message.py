@@ -23,14 +23,15 @@ from pyrogram import Client, Filters, Message
 from .. import glovar
 from ..functions.channel import get_content, get_debug_text
 from ..functions.etc import code, delay, general_link, get_filename, get_forward_name, get_full_name, get_now, get_text
-from ..functions.etc import lang, mention_id, t2t, thread
+from ..functions.etc import lang, mention_id, thread
 from ..functions.file import save
 from ..functions.filters import aio, authorized_group, class_d, declared_message, exchange_channel, from_user
-from ..functions.filters import hide_channel, is_ban_text, is_bio_text, is_class_d_user, is_declared_message
-from ..functions.filters import is_high_score_user, is_in_config, is_limited_user, is_nm_text, is_not_allowed
-from ..functions.filters import is_regex_text, is_watch_user, new_group, test_group
-from ..functions.group import delete_message, leave_group
-from ..functions.ids import init_group_id, init_user_id
+from ..functions.filters import hide_channel, is_bad_bio, is_ban_text, is_class_d_user, is_declared_message
+from ..functions.filters import is_high_score_user, is_in_config, is_limited_user, is_nm_name, is_nm_text
+from ..functions.filters import is_not_allowed, is_qrc, is_regex_text, is_watch_user, new_group, test_group
+from ..functions.group import delete_message, leave_group, update_group
+from ..functions.ids import add_detected_content, add_except_temp, add_user_times, init_group_id, set_trust_ids
+from ..functions.ids import update_join_rate
 from ..functions.receive import receive_add_bad, receive_add_except, receive_captcha_flood, receive_captcha_kicked_user
 from ..functions.receive import receive_captcha_kicked_users, receive_config_commit, receive_clear_data
 from ..functions.receive import receive_config_reply, receive_config_show, receive_declared_message
@@ -38,10 +39,10 @@ from ..functions.receive import receive_flood_score, receive_preview, receive_le
 from ..functions.receive import receive_refresh, receive_remove_bad, receive_remove_except, receive_remove_score
 from ..functions.receive import receive_remove_watch, receive_remove_white, receive_rollback, receive_text_data
 from ..functions.receive import receive_user_score, receive_watch_user, receive_white_users
-from ..functions.telegram import get_admins, get_user_bio, send_message
+from ..functions.telegram import get_admins, get_user_bios, send_message
 from ..functions.tests import clean_test
 from ..functions.timers import backup_files, send_count
-from ..functions.user import terminate_user
+from ..functions.user import check_media, terminate_user
 
 # Enable logging
 logger = logging.getLogger(__name__)
@@ -70,23 +71,28 @@ def check(client: Client, message: Message) -> bool:
         if glovar.nospam_id in glovar.admin_ids[gid]:
             # Check the forward from name
             forward_name = get_forward_name(message)
+            forward_id = ((message.forward_from and message.forward_from.id)
+                          or (message.forward_from_chat and message.forward_from_chat.id)
+                          or 0)
 
             if forward_name and forward_name not in glovar.except_ids["long"]:
-                if is_nm_text(t2t(forward_name, True, True)):
+                if is_nm_name(("forward", forward_id), forward_name):
                     return False
 
             # Check the user's name
             name = get_full_name(message.from_user)
 
             if name and name not in glovar.except_ids["long"]:
-                if is_nm_text(t2t(name, True, True)):
+                if is_nm_name(("user", message.from_user.id), name):
                     return False
 
             # Check contact
             contact_name = get_full_name(message.contact, True, True, True)
+            contact_id = (message.contact and message.contact.user_id) or 0
 
-            if contact_name and contact_name not in glovar.except_ids["long"] and is_nm_text(contact_name):
-                return False
+            if contact_name and contact_name not in glovar.except_ids["long"]:
+                if is_nm_name(("contact", contact_id), contact_name, False):
+                    return False
 
             # Check the text
             message_text = get_text(message, True, True)
@@ -131,17 +137,23 @@ def check(client: Client, message: Message) -> bool:
 
         # Not allowed message
         content = get_content(message)
-        detection = is_not_allowed(client, message)
+        detection = is_not_allowed(client, message, media=False)
+
+        # Hand the media stage to the media pool, check it inline if the pool is full
+        if detection == "media" and glovar.media_slots.acquire(False):
+            glovar.media_executor.submit(check_media, client, message)
+            return True
+        elif detection == "media":
+            detection = is_qrc(client, message) and "qrc"
 
         if detection:
             result = terminate_user(client, message, detection)
 
             if result and content and detection != "true" and detection in glovar.types["spam"]:
-                glovar.contents[content] = detection
+                add_detected_content(content, detection)
         elif message.sticker:
             if content:
-                glovar.except_ids["temp"].add(content)
-                save("except_ids")
+                add_except_temp(content)
 
         return True
     except Exception as e:
@@ -163,51 +175,63 @@ def check_join(client: Client, message: Message) -> bool:
     # Check new joined user
     result = False
 
+    # Check raid status
+    gid = message.chat.id
+    now = message.date or get_now()
+    uids = [new.id for new in message.new_chat_members]
+    raid = gid in glovar.flooded_ids or update_join_rate(gid, len(uids), now) >= glovar.raid_limit
+
+    # Fetch the new members' bios outside the lock, check them after the event during a raid
+    bios = {}
+
+    if glovar.nospam_id in glovar.admin_ids.get(gid, set()) and not raid:
+        bios = get_user_bios(client, uids)
+
+    joined = []
+
     glovar.locks["message"].acquire()
 
     try:
         # Basic data
-        gid = message.chat.id
         mid = message.message_id
-        now = message.date or get_now()
+        verdicts = {}
 
-        for new in message.new_chat_members:
-            # Check group status
-            if gid in glovar.flooded_ids:
-                continue
+        # Check declare status
+        if is_declared_message(None, message):
+            return True
 
+        for new in message.new_chat_members:
             # Basic data
             uid = new.id
 
             # Check if the user is Class D personnel
             if is_class_d_user(new):
+                if raid:
+                    continue
+
                 return True
 
             # Work with NOSPAM
             if glovar.nospam_id in glovar.admin_ids[gid]:
-                # Check name
+                # Check name, evaluate each distinct name once
                 name = get_full_name(new, True, True)
 
-                if name and is_nm_text(name):
-                    return True
+                if name and name not in verdicts:
+                    verdicts[name] = is_nm_text(name)
 
-                # Check bio
-                bio = get_user_bio(client, uid, True, True)
+                if name and verdicts[name]:
+                    if raid:
+                        continue
 
-                if bio and is_bio_text(bio):
                     return True
 
-            # Check declare status
-            if is_declared_message(None, message):
-                return True
-
-            # Init the user's status
-            if not init_user_id(uid):
-                continue
+                # Check bio
+                if raid:
+                    glovar.raid_bios.setdefault(gid, set()).add(uid)
+                elif is_bad_bio(bios.get(uid, "")):
+                    return True
 
-            # Update user's join status
-            glovar.user_ids[uid]["join"][gid] = now
-            save("user_ids")
+            joined.append(uid)
 
         # Delete service message
         if not is_in_config(gid, "ser"):
@@ -227,6 +251,15 @@ def check_join(client: Client, message: Message) -> bool:
     except Exception as e:
         logger.warning(f"Check join error: {e}", exc_info=True)
     finally:
+        # Update users' join status, flush it later during a raid
+        if joined:
+            add_user_times("join", joined, gid, now)
+
+            if raid:
+                glovar.raid_ids.add(gid)
+            else:
+                save("user_ids")
+
         glovar.locks["message"].release()
 
     return result
@@ -315,11 +348,14 @@ def init_group(client: Client, message: Message) -> bool:
                 save("admin_ids")
 
                 # Trust list
-                glovar.trust_ids[gid] = {admin.user.id for admin in admin_members
-                                         if ((not admin.user.is_bot and not admin.user.is_deleted)
-                                             or admin.user.id in glovar.bot_ids)}
+                set_trust_ids(gid, {admin.user.id for admin in admin_members
+                                    if ((not admin.user.is_bot and not admin.user.is_deleted)
+                                        or admin.user.id in glovar.bot_ids)})
                 save("trust_ids")
 
+                # Warm the group's cache
+                update_group(client, gid)
+
                 # Text
                 text += f"{lang('status')}{lang('colon')}{code(lang('status_joined'))}\n"
             else:
@@ -351,6 +387,51 @@ def init_group(client: Client, message: Message) -> bool:
     return False
 
 
+@Client.on_message(Filters.incoming & Filters.group
+                   & (Filters.pinned_message | Filters.new_chat_title)
+                   & ~test_group & authorized_group, group=-1)
+def invalidate_group(client: Client, message: Message) -> bool:
+    # Refresh the group's cache when the group's info changes
+    try:
+        # Basic data
+        gid = message.chat.id
+
+        # Update the cache
+        thread(update_group, (client, gid))
+
+        return True
+    except Exception as e:
+        logger.warning(f"Invalidate group error: {e}", exc_info=True)
+
+    return False
+
+
+@Client.on_message(Filters.incoming & Filters.group
+                   & (Filters.new_chat_members | Filters.left_chat_member)
+                   & ~test_group & authorized_group, group=-1)
+def invalidate_member(client: Client, message: Message) -> bool:
+    # Remove the cached status of joined or left members
+    try:
+        # Basic data
+        gid = message.chat.id
+        members = glovar.members.get(gid, {})
+
+        # Remove the cache
+        with glovar.locks["member"]:
+            if message.new_chat_members:
+                for user in message.new_chat_members:
+                    members.pop(user.id, None)
+
+            if message.left_chat_member:
+                members.pop(message.left_chat_member.id, None)
+
+        return True
+    except Exception as e:
+        logger.warning(f"Invalidate member error: {e}", exc_info=True)
+
+    return False
+
+
 @Client.on_message((Filters.incoming | aio) & Filters.channel
                    & ~Filters.command(glovar.all_commands, glovar.prefix)
                    & exchange_channel)
@@ -447,7 +528,7 @@ def process_data(client: Client, message: Message) -> bool:
                     if action_type == "now":
                         thread(backup_files, (client,))
                     elif action_type == "rollback":
-                        receive_rollback(client, message, data)
+                        thread(receive_rollback, (client, message, data))
 
                 elif action == "clear":
                     receive_clear_data(client, action_type, data)